@@ -0,0 +1,219 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+from unittest.mock import patch
+
+import program_manager
+from program_manager import FakeProcessBackend, ProcessInfo, ProcessSnapshot, ProgramManager
+
+SCALES = {
+    "small": {"programs": 60, "processes": 200, "files": 10_000},
+    "medium": {"programs": 1_000, "processes": 2_000, "files": 100_000},
+    "large": {"programs": 10_000, "processes": 10_000, "files": 1_000_000},
+}
+
+def synthetic_template(programs: int, per_category: int = 10, processes_per_program: int = 3) -> Dict[str, Dict[str, dict]]:
+    template = {}
+    for i in range(programs):
+        category = template.setdefault(f"Category {i // per_category}", {})
+        category[f"Program {i}"] = {"processes": [f"app{i}_{j}.exe" for j in range(processes_per_program)]}
+    return template
+
+def synthetic_processes(template: Dict[str, Dict[str, dict]], count: int, running_ratio: float, seed: int = 0) -> List[ProcessInfo]:
+    # A share of the processes belong to template programs, the rest is unrelated system noise
+    rng = random.Random(seed)
+    images = [process for programs in template.values() for details in programs.values() for process in details["processes"]]
+    processes = []
+    for pid in range(1000, 1000 + count):
+        name = rng.choice(images) if rng.random() < running_ratio else f"system{pid % 97}.exe"
+        processes.append(ProcessInfo(name, pid))
+    return processes
+
+def generate_tree(root: str, template: Dict[str, Dict[str, dict]], files: int, depth: int, density: float,
+                  files_per_dir: int = 20, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    images = [process for programs in template.values() for details in programs.values() for process in details["processes"]]
+    directories = max(1, files // files_per_dir)
+    fanout = max(2, round(directories ** (1 / max(1, depth))))
+    for d in range(directories):
+        # Spell the directory index in base <fanout> so the tree gets <depth> levels
+        parts, n = [], d
+        for _ in range(depth):
+            parts.append(f"dir{n % fanout}")
+            n //= fanout
+        directory = os.path.join(root, *reversed(parts))
+        os.makedirs(directory, exist_ok=True)
+        for f in range(files_per_dir):
+            if rng.random() < density:
+                name = rng.choice(images)
+            else:
+                name = f"file{f}.exe" if f % 4 == 0 else f"file{f}.dll"
+            open(os.path.join(directory, name), "w").close()
+
+def measure(fn: Callable[[], None], repeat: int, setup: Callable[[], None] = None) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+class BenchmarkRun:
+    def __init__(self, workdir: str, repeat: int, latency: float):
+        self.workdir = workdir
+        self.repeat = repeat
+        self.latency = latency
+        self.results: List[dict] = []
+
+    def record(self, name: str, scale: str, params: dict, timings: List[float]) -> None:
+        result = {
+            "name": name,
+            "scale": scale,
+            "params": params,
+            "runs": len(timings),
+            "min": min(timings),
+            "median": statistics.median(timings),
+            "mean": statistics.mean(timings),
+        }
+        self.results.append(result)
+        print(f"{name:<28} {scale:<8} median {result['median'] * 1000:10.2f} ms  min {result['min'] * 1000:10.2f} ms", file=sys.stderr)
+
+    def manager(self, scale_dir: str, template: Dict[str, Dict[str, dict]], backend: FakeProcessBackend) -> ProgramManager:
+        template_file = os.path.join(scale_dir, "programs.json")
+        if not os.path.exists(template_file):
+            with open(template_file, "w") as f:
+                json.dump(template, f)
+        manager = ProgramManager(config_file=template_file, process_backend=backend, snapshot_ttl=0)
+        manager.user_config_file = os.path.join(scale_dir, "programs_db.json")
+        manager.paths_file = os.path.join(scale_dir, "paths.json")
+        manager.config_cache_file = os.path.join(scale_dir, "config_cache.bin")
+        return manager
+
+    def run_scale(self, scale: str, settings: dict, include_scan: bool, depth: int, density: float) -> None:
+        scale_dir = os.path.join(self.workdir, scale)
+        os.makedirs(scale_dir)
+        template = synthetic_template(settings["programs"])
+        processes = synthetic_processes(template, settings["processes"], running_ratio=0.1)
+        backend = FakeProcessBackend(processes, latency=self.latency)
+        params = {"programs": settings["programs"], "processes": settings["processes"], "latency": self.latency}
+
+        # Keep the default config paths out of the way while the manager is built
+        with patch.object(ProgramManager, "load_config"):
+            manager = self.manager(scale_dir, template, backend)
+
+        def drop_config_cache() -> None:
+            if os.path.exists(manager.config_cache_file):
+                os.remove(manager.config_cache_file)
+
+        self.record("load_config.cold", scale, params, measure(manager.load_config, self.repeat, drop_config_cache))
+        self.record("load_config.cached", scale, params, measure(manager.load_config, self.repeat))
+
+        programs = [program for category in manager.programs.values() for program in category.values()]
+
+        def probe_all() -> None:
+            snapshot = ProcessSnapshot.capture(backend)
+            for program in programs:
+                program.is_running(snapshot)
+
+        self.record("is_running.all_programs", scale, params, measure(probe_all, self.repeat))
+        self.record("list_programs", scale, params, measure(manager.list_programs, self.repeat))
+        self.record("list_categories", scale, params, measure(manager.list_categories, self.repeat))
+
+        def reset_processes() -> None:
+            backend.processes = list(processes)
+            manager.process_table.invalidate()
+
+        def end_first_category() -> None:
+            with patch("rich.prompt.Prompt.ask", side_effect=["1", "0"]):
+                manager.end_categories()
+
+        self.record("end_categories", scale, params, measure(end_first_category, self.repeat, reset_processes))
+
+        if include_scan:
+            tree = os.path.join(scale_dir, "tree")
+            generate_tree(tree, template, settings["files"], depth, density)
+            with open(manager.paths_file, "w") as f:
+                json.dump({"paths": [tree]}, f)
+            scan_params = {"programs": settings["programs"], "files": settings["files"], "depth": depth, "density": density}
+
+            def full_rescan() -> None:
+                manager.full_rescan = True
+
+            def warm_rescan() -> None:
+                manager.full_rescan = False
+
+            self.record("scan_programs.cold", scale, scan_params, measure(manager.scan_programs, self.repeat, full_rescan))
+            self.record("scan_programs.warm", scale, scan_params, measure(manager.scan_programs, self.repeat, warm_rescan))
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(results: List[dict], baseline_file: str) -> None:
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        baseline = {(result["name"], result["scale"]): result for result in json.load(f)["results"]}
+    print(f"\nCompared with {baseline_file}:", file=sys.stderr)
+    for result in results:
+        previous = baseline.get((result["name"], result["scale"]))
+        if previous is None:
+            continue
+        ratio = result["median"] / previous["median"] if previous["median"] else float("inf")
+        print(f"{result['name']:<28} {result['scale']:<8} {ratio:6.2f}x", file=sys.stderr)
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Program Manager benchmarks (fake process backend, synthetic install trees)")
+    parser.add_argument("--scales", nargs="+", default=["small", "medium"], choices=list(SCALES), help="Scales to run")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per tasklist/taskkill spawn")
+    parser.add_argument("--depth", type=int, default=4, help="Directory depth of the generated trees")
+    parser.add_argument("--density", type=float, default=0.01, help="Share of generated files that match a template program")
+    parser.add_argument("--no-scan", action="store_true", help="Skip the tree generation and scan benchmarks")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    parser.add_argument("--compare", help="Print median ratios against an earlier results file")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="program_manager_bench_")
+    # Render tables into memory so terminal speed does not skew the numbers
+    from rich.console import Console
+    program_manager.LazyConsole._console = Console(file=io.StringIO(), width=120)
+    run = BenchmarkRun(workdir, args.repeat, args.latency)
+    try:
+        for scale in args.scales:
+            run.run_scale(scale, SCALES[scale], not args.no_scan, args.depth, args.density)
+    finally:
+        program_manager.LazyConsole._console = None
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": run.results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        compare(run.results, args.compare)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
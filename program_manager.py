@@ -3,19 +3,33 @@ import os
 import subprocess
 import argparse
 import logging
-from typing import Dict, List
-from rich.console import Console
-from rich.table import Table
-from rich.prompt import Prompt
-from rich.logging import RichHandler
-import pyfiglet
+import logging.handlers
+import csv
+import fnmatch
+import hashlib
+import re
+import signal
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from enum import Enum
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+import atexit
 import getpass
-import glob
-import ctypes
+import marshal
+import queue
 import sys
 
+# rich, pyfiglet and ctypes are imported where they are first used, so scripted runs never pay for the UI stack
+STARTED_AT = time.perf_counter()
+DEFAULT_CATALOG_FILE = "data/catalog.db"
+DEFAULT_AGENT_PORT = 8765
+
 def is_admin():
     try:
+        import ctypes
         return ctypes.windll.shell32.IsUserAnAdmin()
     except:
         return False
@@ -25,57 +39,1581 @@ def run_as_admin():
         return True
     else:
         # Re-run the program with admin rights
+        import ctypes
         ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.executable, " ".join(sys.argv), None, 1)
         return False
 
-console = Console()
+class Metrics:
+    # Latency buckets in seconds; samples are folded into counts so memory stays constant however long a session runs
+    BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float("inf")]
+
+    def __init__(self):
+        self.enabled = False
+        self.counters: Dict[str, int] = {}
+        self.latencies: Dict[str, dict] = {}
+        self.actions: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def count(self, name: str, amount: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            latency = self.latencies.get(name)
+            if latency is None:
+                latency = self.latencies[name] = {"count": 0, "total": 0.0, "max": 0.0, "buckets": [0] * len(self.BUCKETS)}
+            latency["count"] += 1
+            latency["total"] += seconds
+            latency["max"] = max(latency["max"], seconds)
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    latency["buckets"][i] += 1
+                    break
+
+    @contextmanager
+    def timer(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def record_action(self, name: str, programs: int, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            action = self.actions.setdefault(name, {"count": 0, "programs": 0, "total": 0.0})
+            action["count"] += 1
+            action["programs"] += programs
+            action["total"] += seconds
+
+    def percentile(self, name: str, fraction: float) -> float:
+        # Upper bound of the bucket that holds the requested fraction of samples
+        latency = self.latencies[name]
+        threshold = latency["count"] * fraction
+        seen = 0
+        for bound, count in zip(self.BUCKETS, latency["buckets"]):
+            seen += count
+            if seen >= threshold:
+                return min(bound, latency["max"])
+        return latency["max"]
+
+    def summary(self) -> dict:
+        return {
+            "counters": dict(self.counters),
+            "latencies": {
+                name: {"count": latency["count"], "total": round(latency["total"], 6), "max": round(latency["max"], 6),
+                       "p50": round(self.percentile(name, 0.5), 6), "p95": round(self.percentile(name, 0.95), 6),
+                       "buckets": dict(zip([str(bound) for bound in self.BUCKETS], latency["buckets"]))}
+                for name, latency in sorted(self.latencies.items())
+            },
+            "actions": dict(self.actions),
+        }
+
+    def print_summary(self) -> None:
+        from rich.table import Table
+        table = Table(title="Profile")
+        table.add_column("Operation", style="yellow")
+        table.add_column("Count", style="cyan", justify="right")
+        table.add_column("Total", style="magenta", justify="right")
+        table.add_column("p50", style="blue", justify="right")
+        table.add_column("p95", style="blue", justify="right")
+        table.add_column("Max", style="blue", justify="right")
+        summary = self.summary()
+        for name, latency in summary["latencies"].items():
+            table.add_row(name, str(latency["count"]), f"{latency['total'] * 1000:.1f} ms", f"≤{latency['p50'] * 1000:.1f} ms",
+                          f"≤{latency['p95'] * 1000:.1f} ms", f"{latency['max'] * 1000:.1f} ms")
+        table.add_section()
+        for name, count in sorted(summary["counters"].items()):
+            table.add_row(name, str(count), "", "", "", "")
+        table.add_section()
+        for name, action in sorted(summary["actions"].items()):
+            table.add_row(f"action: {name}", str(action["count"]), f"{action['total'] * 1000:.1f} ms", "", "",
+                          f"{action['programs']} programs")
+        console.print(table)
+
+metrics = Metrics()
+
+def spawn(args: List[str], **kwargs) -> subprocess.CompletedProcess:
+    metrics.count("subprocess.spawns")
+    with metrics.timer(f"subprocess.{args[0]}"):
+        return subprocess.run(args, **kwargs)
+
+class LazyConsole:
+    _console = None
+
+    def get(self):
+        if LazyConsole._console is None:
+            from rich.console import Console
+            LazyConsole._console = Console()
+        return LazyConsole._console
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+console = LazyConsole()
+
+class ProcessInfo(NamedTuple):
+    name: str
+    pid: int
+    # Only filled in when a snapshot is taken with details=True, because rules with path or cmdline constraints need them
+    path: Optional[str] = None
+    cmdline: Optional[str] = None
+    ppid: Optional[int] = None
+    # Working set in bytes and CPU time in seconds, None where the backend can't tell
+    memory: Optional[int] = None
+    cpu_time: Optional[float] = None
+    # Start time in seconds, only comparable between processes of one backend (procfs counts from boot)
+    started: Optional[float] = None
+
+class EndStatus(Enum):
+    ENDED = "ended"
+    NOT_RUNNING = "not running"
+    ACCESS_DENIED = "access denied"
+    TIMED_OUT = "timed out"
+    FAILED = "failed"
+
+class ProcessBackend:
+    # Typical seconds per kill or close call, used to estimate dry runs before anything has been measured
+    expected_latency = 0.0
+
+    def list_processes(self, details: bool = False) -> List[ProcessInfo]:
+        raise NotImplementedError
+
+    def kill_pids(self, pids: List[int], timeout: float) -> Dict[int, EndStatus]:
+        raise NotImplementedError
+
+    def close_pids(self, pids: List[int], timeout: float) -> Dict[int, EndStatus]:
+        # Asks the processes to exit; ENDED only means the request was delivered
+        raise NotImplementedError
+
+    def query_images(self, images: List[str], timeout: float) -> bool:
+        running = {process.name.lower() for process in self.list_processes()}
+        return any(image.lower() in running for image in images)
+
+class TasklistBackend(ProcessBackend):
+    expected_latency = 0.15
+
+    def __init__(self, timeout: float = 10.0):
+        self.timeout = timeout
+
+    def list_processes(self, details: bool = False) -> List[ProcessInfo]:
+        if details:
+            return self._list_details()
+        # One tasklist call for the whole process table, e.g. "chrome.exe","1234","Console","1","123,456 K"
+        result = spawn(["tasklist", "/FO", "CSV", "/NH"], check=True, capture_output=True, text=True, encoding='utf-8', errors='replace', timeout=self.timeout)
+        return self._parse(result.stdout)
+
+    def _list_details(self) -> List[ProcessInfo]:
+        # tasklist has no executable path, command line, parent PID or CPU time, so ask CIM once for the whole table instead
+        # CreationDate goes out as a FILETIME number, its CSV text form depends on the locale
+        query = ("Get-CimInstance Win32_Process | Select-Object Name,ProcessId,ExecutablePath,CommandLine,ParentProcessId,"
+                 "WorkingSetSize,UserModeTime,KernelModeTime,@{n='CreationDate';e={$_.CreationDate.ToFileTimeUtc()}} | ConvertTo-Csv -NoTypeInformation")
+        result = spawn(["powershell", "-NoProfile", "-NonInteractive", "-Command", query], check=True, capture_output=True, text=True,
+                       encoding='utf-8', errors='replace', timeout=self.timeout)
+        processes = []
+        for row in csv.reader(result.stdout.splitlines()):
+            if len(row) < 8 or not row[1].isdigit():
+                continue
+            number = lambda value: int(value) if value.isdigit() else None
+            # CPU times and FILETIMEs are in 100 ns units
+            cpu_time = (number(row[6]) or 0) + (number(row[7]) or 0) if row[6] or row[7] else None
+            created = number(row[8]) if len(row) > 8 else None
+            processes.append(ProcessInfo(row[0], int(row[1]), row[2] or None, row[3] or None, number(row[4]), number(row[5]),
+                                         None if cpu_time is None else cpu_time / 1e7, None if created is None else created / 1e7))
+        return processes
+
+    def _parse(self, output: str) -> List[ProcessInfo]:
+        processes = []
+        for row in csv.reader(output.splitlines()):
+            if len(row) < 2 or not row[1].isdigit():
+                continue
+            # "123,456 K" with a locale dependent thousands separator
+            memory = re.sub(r"\D", "", row[4]) if len(row) > 4 else ""
+            processes.append(ProcessInfo(row[0], int(row[1]), memory=int(memory) * 1024 if memory else None))
+        return processes
+
+    def query_images(self, images: List[str], timeout: float) -> bool:
+        for image in images:
+            result = spawn(["tasklist", "/FI", f"IMAGENAME eq {image}", "/FO", "CSV", "/NH"], capture_output=True, text=True, encoding='utf-8', errors='replace', timeout=timeout)
+            if any(process.name.lower() == image.lower() for process in self._parse(result.stdout)):
+                return True
+        return False
+
+    def kill_pids(self, pids: List[int], timeout: float) -> Dict[int, EndStatus]:
+        return self._taskkill(["taskkill", "/F"], pids, timeout)
+
+    def close_pids(self, pids: List[int], timeout: float) -> Dict[int, EndStatus]:
+        # Without /F taskkill posts WM_CLOSE, so programs get to save state and shut down their helpers
+        return self._taskkill(["taskkill"], pids, timeout)
+
+    def _taskkill(self, args: List[str], pids: List[int], timeout: float) -> Dict[int, EndStatus]:
+        args = list(args)
+        for pid in pids:
+            args += ["/PID", str(pid)]
+        result = spawn(args, capture_output=True, text=True, encoding='utf-8', errors='replace', timeout=timeout)
+
+        # Unparseable (e.g. localized) output falls back to the exit code for the whole batch
+        statuses = {pid: EndStatus.ENDED if result.returncode == 0 else EndStatus.FAILED for pid in pids}
+        last_pid = None
+        for line in (result.stdout + result.stderr).splitlines():
+            match = re.search(r'PID (\d+)|"(\d+)"', line)
+            if line.startswith("Reason:") and last_pid is not None:
+                if "denied" in line.lower():
+                    statuses[last_pid] = EndStatus.ACCESS_DENIED
+            elif match:
+                pid = int(match.group(1) or match.group(2))
+                if line.startswith("SUCCESS"):
+                    statuses[pid] = EndStatus.ENDED
+                elif line.startswith("ERROR"):
+                    statuses[pid] = EndStatus.NOT_RUNNING if "not found" in line else EndStatus.FAILED
+                    last_pid = pid
+        return statuses
+
+class ProcfsBackend(ProcessBackend):
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+    CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def __init__(self, root: str = "/proc"):
+        self.root = root
+
+    def list_processes(self, details: bool = False) -> List[ProcessInfo]:
+        processes = []
+        for entry in os.listdir(self.root):
+            if not entry.isdigit():
+                continue
+            try:
+                # stat has the name and the parent PID in one read, e.g. "1234 (steam) S 1 ..."
+                with open(os.path.join(self.root, entry, "stat"), "r", encoding="utf-8", errors="replace") as f:
+                    stat = f.read()
+            except OSError:
+                # The process exited between listdir and open
+                continue
+            end = stat.rindex(")")
+            fields = stat[end + 2:].split()
+            name, ppid = stat[stat.index("(") + 1:end], int(fields[1])
+            # utime, stime and starttime are in clock ticks, rss in pages (fields 14, 15, 22 and 24 of proc(5))
+            memory = int(fields[21]) * self.PAGE_SIZE if len(fields) > 21 else None
+            cpu_time = (int(fields[11]) + int(fields[12])) / self.CLOCK_TICKS if len(fields) > 12 else None
+            started = int(fields[19]) / self.CLOCK_TICKS if len(fields) > 19 else None
+            path, cmdline = self._details(entry) if details else (None, None)
+            processes.append(ProcessInfo(name, int(entry), path, cmdline, ppid, memory, cpu_time, started))
+        return processes
+
+    def _details(self, entry: str) -> Tuple[Optional[str], Optional[str]]:
+        # Other users' processes and kernel threads have no readable exe link or cmdline
+        try:
+            path = os.readlink(os.path.join(self.root, entry, "exe"))
+        except OSError:
+            path = None
+        try:
+            with open(os.path.join(self.root, entry, "cmdline"), "rb") as f:
+                cmdline = f.read().rstrip(b"\0").replace(b"\0", b" ").decode("utf-8", errors="replace") or None
+        except OSError:
+            cmdline = None
+        return path, cmdline
+
+    def kill_pids(self, pids: List[int], timeout: float) -> Dict[int, EndStatus]:
+        return self._signal(pids, signal.SIGKILL)
+
+    def close_pids(self, pids: List[int], timeout: float) -> Dict[int, EndStatus]:
+        return self._signal(pids, signal.SIGTERM)
+
+    def _signal(self, pids: List[int], signum: int) -> Dict[int, EndStatus]:
+        statuses = {}
+        for pid in pids:
+            try:
+                os.kill(pid, signum)
+                statuses[pid] = EndStatus.ENDED
+            except ProcessLookupError:
+                statuses[pid] = EndStatus.NOT_RUNNING
+            except PermissionError:
+                statuses[pid] = EndStatus.ACCESS_DENIED
+        return statuses
+
+class FakeProcessBackend(ProcessBackend):
+    # latency simulates the cost of spawning tasklist/taskkill on every call.
+    # A graceful close makes a process exit after close_delay seconds, unless it is stubborn and has to be killed.
+    def __init__(self, processes: Iterable[ProcessInfo] = (), protected: Iterable[int] = (), latency: float = 0.0,
+                 stubborn: Iterable[int] = (), close_delay: float = 0.0):
+        self.processes = list(processes)
+        self.protected = set(protected)
+        self.latency = latency
+        self.stubborn = set(stubborn)
+        self.close_delay = close_delay
+        self.closing: Dict[int, float] = {}
+        self.calls = 0
+        self.kill_calls: List[List[int]] = []
+        self.close_calls: List[List[int]] = []
+
+    @property
+    def expected_latency(self) -> float:
+        return self.latency
+
+    def list_processes(self, details: bool = False) -> List[ProcessInfo]:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.closing:
+            now = time.monotonic()
+            exited = {pid for pid, due in self.closing.items() if due <= now}
+            self.processes = [process for process in self.processes if process.pid not in exited]
+            self.closing = {pid: due for pid, due in self.closing.items() if pid not in exited}
+        return list(self.processes)
+
+    def close_pids(self, pids: List[int], timeout: float) -> Dict[int, EndStatus]:
+        self.close_calls.append(list(pids))
+        running = {process.pid for process in self.processes}
+        statuses = {}
+        for pid in pids:
+            if pid not in running:
+                statuses[pid] = EndStatus.NOT_RUNNING
+            elif pid in self.protected:
+                statuses[pid] = EndStatus.ACCESS_DENIED
+            else:
+                statuses[pid] = EndStatus.ENDED
+                if pid not in self.stubborn:
+                    self.closing.setdefault(pid, time.monotonic() + self.close_delay)
+        return statuses
+
+    def kill_pids(self, pids: List[int], timeout: float) -> Dict[int, EndStatus]:
+        self.kill_calls.append(list(pids))
+        if self.latency:
+            time.sleep(self.latency)
+        running = {process.pid for process in self.processes}
+        statuses = {}
+        for pid in pids:
+            if pid not in running:
+                statuses[pid] = EndStatus.NOT_RUNNING
+            elif pid in self.protected:
+                statuses[pid] = EndStatus.ACCESS_DENIED
+            else:
+                statuses[pid] = EndStatus.ENDED
+        self.processes = [process for process in self.processes if statuses.get(process.pid) != EndStatus.ENDED]
+        return statuses
+
+def default_process_backend() -> ProcessBackend:
+    if os.name == "nt":
+        return TasklistBackend()
+    return ProcfsBackend()
+
+class ProcessSnapshot:
+    def __init__(self, processes: Iterable[ProcessInfo], taken_at: float = None):
+        self.processes = list(processes)
+        self.taken_at = time.monotonic() if taken_at is None else taken_at
+        # Image names are case-insensitive on Windows, so index them lowercased
+        self.index: Dict[str, List[ProcessInfo]] = {}
+        for process in self.processes:
+            self.index.setdefault(process.name.lower(), []).append(process)
+        self._keys: Optional[Dict[Tuple[int, str], ProcessInfo]] = None
+        self._children: Optional[Dict[int, List[ProcessInfo]]] = None
+        self.details = False
+
+    @classmethod
+    def capture(cls, backend: ProcessBackend = None, details: bool = False) -> "ProcessSnapshot":
+        backend = backend or default_process_backend()
+        snapshot = cls(backend.list_processes(details) if details else backend.list_processes())
+        snapshot.details = details
+        return snapshot
+
+    def pids(self, image: str) -> List[int]:
+        return [process.pid for process in self.index.get(image.lower(), [])]
+
+    def is_running(self, image: str) -> bool:
+        return image.lower() in self.index
+
+    def keys(self) -> Dict[Tuple[int, str], ProcessInfo]:
+        if self._keys is None:
+            self._keys = {(process.pid, process.name.lower()): process for process in self.processes}
+        return self._keys
+
+    def descendants(self, roots: Iterable[ProcessInfo]) -> List[ProcessInfo]:
+        # Breadth first, so parents always come before their children; the seen set guards against PID reuse cycles
+        if self._children is None:
+            self._children = {}
+            for process in self.processes:
+                if process.ppid is not None and process.ppid != process.pid:
+                    self._children.setdefault(process.ppid, []).append(process)
+        tree, seen = [], set()
+        queue = list(roots)
+        while queue:
+            process = queue.pop(0)
+            if process.pid in seen:
+                continue
+            seen.add(process.pid)
+            tree.append(process)
+            # An orphan keeps its dead parent's PID, which may since have been reused by an unrelated process,
+            # so a child has to have started after its parent
+            queue.extend(child for child in self._children.get(process.pid, ())
+                         if child.started is None or process.started is None or child.started >= process.started)
+        return tree
+
+    def diff(self, previous: Optional["ProcessSnapshot"]) -> Tuple[List[ProcessInfo], List[ProcessInfo]]:
+        # A PID that shows up under another image name was reused, so it counts as one exit and one start
+        current = self.keys()
+        before = previous.keys() if previous is not None else {}
+        started = [process for key, process in current.items() if key not in before]
+        exited = [process for key, process in before.items() if key not in current]
+        return started, exited
+
+class ProcessTable:
+    def __init__(self, backend: ProcessBackend = None, ttl: float = 2.0):
+        self.backend = backend or default_process_backend()
+        self.ttl = ttl
+        self.details = False
+        self._snapshot: Optional[ProcessSnapshot] = None
+
+    def refresh(self) -> ProcessSnapshot:
+        with metrics.timer("status.snapshot"):
+            self._snapshot = ProcessSnapshot.capture(self.backend, self.details)
+        logging.debug(f"Captured process snapshot with {len(self._snapshot.processes)} processes")
+        return self._snapshot
+
+    def snapshot(self) -> ProcessSnapshot:
+        if self._snapshot is None or time.monotonic() - self._snapshot.taken_at > self.ttl or (self.details and not self._snapshot.details):
+            return self.refresh()
+        return self._snapshot
+
+    def invalidate(self) -> None:
+        self._snapshot = None
+
+class ProcessRule:
+    # A "processes" entry: "steam.exe" (exact), "*updater*.exe" (glob), "re:^chrome.*\\.exe$" (regex), or an object
+    # {"image": <any of those>, "path": <glob on the executable path>, "cmdline": <regex searched in the command line>}
+    __slots__ = ("owner", "label", "exact", "pattern", "standalone", "path", "cmdline")
+    # Backreferences (\1, (?P=name), (?(1)...)) would point at other rules' groups once patterns are combined
+    GROUP_REFERENCE = re.compile(r"(?<!\\)(?:\\\\)*\\[1-9]|\(\?P=|\(\?\(")
+
+    def __init__(self, owner, entry: Union[str, dict]):
+        try:
+            self.compile(owner, entry)
+        except re.error as e:
+            # A bare regex error doesn't say which program the broken rule belongs to
+            name = owner.name if isinstance(owner, Program) else "/".join(map(str, owner[:2])) if isinstance(owner, tuple) else owner
+            raise re.error(f"{name}: invalid pattern {rule_label(entry)!r} ({e.msg})") from e
+
+    def compile(self, owner, entry: Union[str, dict]) -> None:
+        spec = entry if isinstance(entry, dict) else {"image": entry}
+        image = spec["image"]
+        self.owner = owner
+        self.label = image
+        self.exact: Optional[str] = None
+        self.pattern: Optional[str] = None
+        if image.startswith("re:"):
+            self.pattern = image[3:]
+        elif any(char in image for char in "*?["):
+            self.pattern = fnmatch.translate(image)
+        else:
+            self.exact = image.lower()
+        self.path = re.compile(fnmatch.translate(spec["path"].replace("\\", "/")), re.IGNORECASE) if spec.get("path") else None
+        self.cmdline = re.compile(spec["cmdline"], re.IGNORECASE) if spec.get("cmdline") else None
+        self.standalone = False
+        if self.pattern is not None:
+            compiled = re.compile(self.pattern)  # Fail on load, not on the first match
+            # Global inline flags, named groups and backreferences break or change meaning inside one alternation,
+            # so such patterns are matched on their own
+            self.standalone = (compiled.flags != re.compile("").flags or bool(compiled.groupindex)
+                               or self.GROUP_REFERENCE.search(self.pattern) is not None)
+
+    @property
+    def constrained(self) -> bool:
+        return self.path is not None or self.cmdline is not None
+
+    def accepts_path(self, path: Optional[str]) -> bool:
+        return self.path is None or (path is not None and self.path.match(path.replace("\\", "/")) is not None)
+
+    def accepts(self, process: ProcessInfo) -> bool:
+        if not self.accepts_path(process.path):
+            return False
+        return self.cmdline is None or (process.cmdline is not None and self.cmdline.search(process.cmdline) is not None)
+
+def rule_label(entry: Union[str, dict]) -> str:
+    if not isinstance(entry, dict):
+        return entry
+    constraints = [f"{key}={entry[key]}" for key in ("path", "cmdline") if entry.get(key)]
+    return f"{entry['image']} ({', '.join(constraints)})" if constraints else entry["image"]
+
+class ProcessMatcher:
+    # Exact names resolve through one dict lookup; every glob and regex is folded into a single alternation that
+    # rejects most names in one pass. Per-name results are memoized since process tables and install trees repeat names.
+    CACHE_LIMIT = 65536
+
+    def __init__(self, owners: Iterable[Tuple[object, Iterable[Union[str, dict]]]]):
+        self.rules: List[ProcessRule] = []
+        self.exact: Dict[str, List[int]] = {}
+        self.patterns: List[Tuple[int, "re.Pattern"]] = []
+        self.standalone: List[Tuple[int, "re.Pattern"]] = []
+        for owner, entries in owners:
+            for entry in entries:
+                rule = ProcessRule(owner, entry)
+                index = len(self.rules)
+                self.rules.append(rule)
+                if rule.exact is not None:
+                    self.exact.setdefault(rule.exact, []).append(index)
+                else:
+                    compiled = (index, re.compile(rule.pattern, re.IGNORECASE))
+                    (self.standalone if rule.standalone else self.patterns).append(compiled)
+        folded = [self.rules[index].pattern for index, _ in self.patterns]
+        self.combined = re.compile("|".join(f"(?:{pattern})" for pattern in folded), re.IGNORECASE) if folded else None
+        self.needs_details = any(rule.constrained for rule in self.rules)
+        self._cache: Dict[str, Tuple[int, ...]] = {}
+
+    @property
+    def has_patterns(self) -> bool:
+        return bool(self.patterns or self.standalone)
+
+    def rules_for_name(self, name: str) -> Tuple[int, ...]:
+        key = name.lower()
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        indices = list(self.exact.get(key, ()))
+        if self.combined is not None and self.combined.fullmatch(key):
+            indices.extend(index for index, pattern in self.patterns if pattern.fullmatch(key))
+        indices.extend(index for index, pattern in self.standalone if pattern.fullmatch(key))
+        indices.sort()
+        if len(self._cache) >= self.CACHE_LIMIT:
+            self._cache.clear()
+        result = self._cache[key] = tuple(indices)
+        return result
+
+    def is_candidate(self, name: str) -> bool:
+        return bool(self.rules_for_name(name))
+
+    def match_file(self, path: str) -> List[object]:
+        # Command-line constraints only apply to running processes, so installed files are matched on name and path
+        owners = []
+        for index in self.rules_for_name(path.replace("\\", "/").rsplit("/", 1)[-1]):
+            rule = self.rules[index]
+            if rule.accepts_path(path) and rule.owner not in owners:
+                owners.append(rule.owner)
+        return owners
+
+    def match(self, snapshot: ProcessSnapshot) -> Dict[int, List[ProcessInfo]]:
+        # Rule index -> matching processes. Without patterns only the rules' own names are looked up.
+        if not self.has_patterns and len(self.exact) < len(snapshot.index):
+            names = [name for name in self.exact if name in snapshot.index]
+        else:
+            names = snapshot.index
+        hits: Dict[int, List[ProcessInfo]] = {}
+        for name in names:
+            indices = self.rules_for_name(name)
+            for index in indices:
+                rule = self.rules[index]
+                processes = [process for process in snapshot.index[name] if rule.accepts(process)] if rule.constrained else snapshot.index[name]
+                if processes:
+                    hits.setdefault(index, []).extend(processes)
+        return hits
+
+    def owners(self, snapshot: ProcessSnapshot) -> Dict[object, List[ProcessInfo]]:
+        found: Dict[object, List[ProcessInfo]] = {}
+        for index, processes in self.match(snapshot).items():
+            found.setdefault(self.rules[index].owner, []).extend(processes)
+        return found
+
+class ResourceUsage(NamedTuple):
+    memory: int = 0
+    cpu_time: Optional[float] = None
+    processes: int = 0
+
+    @classmethod
+    def of(cls, processes: Iterable[ProcessInfo]) -> "ResourceUsage":
+        unique = {process.pid: process for process in processes}.values()
+        cpu_times = [process.cpu_time for process in unique if process.cpu_time is not None]
+        return cls(sum(process.memory or 0 for process in unique), sum(cpu_times) if cpu_times else None, len(unique))
+
+def format_size(size: Optional[int]) -> str:
+    if size is None:
+        return "-"
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def format_cpu_time(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "-"
+    minutes, seconds = divmod(seconds, 60)
+    return f"{int(minutes)}:{seconds:04.1f}"
+
+def parse_size(text: str) -> int:
+    # "512M", "2G", "1.5GB" or a plain byte count
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMG]?)B?\s*", text, re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"invalid size: {text}")
+    return int(float(match.group(1)) * 1024 ** " KMG".index(match.group(2).upper() or " "))
+
+def available_memory() -> Optional[int]:
+    try:
+        if os.name == "nt":
+            import ctypes
+
+            class MemoryStatus(ctypes.Structure):
+                _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong), ("ullTotalPhys", ctypes.c_ulonglong),
+                            ("ullAvailPhys", ctypes.c_ulonglong), ("ullTotalPageFile", ctypes.c_ulonglong),
+                            ("ullAvailPageFile", ctypes.c_ulonglong), ("ullTotalVirtual", ctypes.c_ulonglong),
+                            ("ullAvailVirtual", ctypes.c_ulonglong), ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+            status = MemoryStatus(dwLength=ctypes.sizeof(MemoryStatus))
+            ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status))
+            return status.ullAvailPhys
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, AttributeError, ValueError):
+        pass
+    return None
+
+class EndResult(NamedTuple):
+    program: str
+    process: str
+    status: EndStatus
+    pids: List[int] = []
+    forced: List[int] = []
+
+class TerminationReport(NamedTuple):
+    results: List[EndResult]
+    elapsed: float
+
+    @property
+    def attempted(self) -> List[EndResult]:
+        return [result for result in self.results if result.status != EndStatus.NOT_RUNNING]
+
+    @property
+    def failed(self) -> List[EndResult]:
+        return [result for result in self.attempted if result.status != EndStatus.ENDED]
+
+    def to_json(self) -> dict:
+        return {
+            "elapsed": round(self.elapsed, 4),
+            "results": [{"program": result.program, "process": result.process, "status": result.status.value, "pids": result.pids,
+                         "forced": result.forced} for result in self.results]
+        }
+
+class ProcessTerminator:
+    # Worst outcome wins when one image has several PIDs
+    SEVERITY = [EndStatus.NOT_RUNNING, EndStatus.ENDED, EndStatus.FAILED, EndStatus.ACCESS_DENIED, EndStatus.TIMED_OUT]
+
+    def __init__(self, backend: ProcessBackend, batch_size: int = 32, max_workers: int = 4, timeout: float = 10.0,
+                 graceful: bool = False, close_timeout: float = 5.0, poll_interval: float = 0.25):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.graceful = graceful
+        self.close_timeout = close_timeout
+        self.poll_interval = poll_interval
+        self.batch_latency: Optional[float] = None
+
+    def targets(self, matcher: ProcessMatcher, snapshot: ProcessSnapshot) -> List[Tuple["Program", str, List[int]]]:
+        hits = matcher.match(snapshot)
+        if self.graceful:
+            # Whole trees by PID: helpers with other image names go down with the program instead of respawning it
+            return [(rule.owner, rule.label, [process.pid for process in snapshot.descendants(hits.get(index, ()))])
+                    for index, rule in enumerate(matcher.rules)]
+        return [(rule.owner, rule.label, sorted({process.pid for process in hits.get(index, ())}))
+                for index, rule in enumerate(matcher.rules)]
+
+    def estimate(self, targets: List[Tuple["Program", str, List[int]]]) -> float:
+        # Batches run max_workers at a time; a graceful run may wait up to the longest deadline before the kill pass
+        pids = {pid for _, _, process_pids in targets for pid in process_pids}
+        if not pids:
+            return 0.0
+        batches = -(-len(pids) // self.batch_size)
+        waves = -(-batches // self.max_workers)
+        latency = self.batch_latency if self.batch_latency is not None else self.backend.expected_latency
+        seconds = waves * latency
+        if self.graceful:
+            deadlines = [program.close_timeout if program.close_timeout is not None else self.close_timeout
+                         for program, _, process_pids in targets if process_pids]
+            seconds += waves * latency + max(deadlines)
+        return seconds
+
+    def end(self, programs: Iterable["Program"], snapshot: ProcessSnapshot, matcher: ProcessMatcher = None) -> TerminationReport:
+        start = time.perf_counter()
+        matcher = matcher or ProcessMatcher((program, program.processes) for program in programs)
+        targets = self.targets(matcher, snapshot)
+        # Images shared by several programs are only killed once
+        pids = list(dict.fromkeys(pid for _, _, process_pids in targets for pid in process_pids))
+        if self.graceful:
+            statuses, forced = self.close_trees(targets, snapshot)
+        else:
+            statuses, forced = self.kill_pids(sorted(pids)), set()
+
+        results = []
+        for program, process, process_pids in targets:
+            status = EndStatus.NOT_RUNNING
+            for pid in process_pids:
+                if self.SEVERITY.index(statuses[pid]) > self.SEVERITY.index(status):
+                    status = statuses[pid]
+            results.append(EndResult(program.name, process, status, process_pids, [pid for pid in process_pids if pid in forced]))
+            if status == EndStatus.ENDED:
+                logging.info(f"Successfully ended {process}")
+            elif status != EndStatus.NOT_RUNNING:
+                logging.error(f"Failed to end {process}: {status.value}")
+
+        elapsed = time.perf_counter() - start
+        logging.info(f"Termination of {len(pids)} processes took {elapsed:.3f}s")
+        return TerminationReport(results, elapsed)
+
+    def close_trees(self, targets: List[Tuple["Program", str, List[int]]], snapshot: ProcessSnapshot) -> Tuple[Dict[int, EndStatus], set]:
+        # One close request for every tree, then a single poller waits on all programs at once: each program is
+        # force-killed when its own deadline passes, so the total wait is the longest deadline, not the sum of them.
+        order = list(dict.fromkeys(pid for _, _, pids in targets for pid in pids))
+        names = {process.pid: process.name.lower() for process in snapshot.processes}
+        statuses = self.batched(self._close_batch, order)
+        alive = {pid for pid in order if statuses[pid] != EndStatus.NOT_RUNNING}
+        now = time.monotonic()
+        waiting: Dict["Program", Tuple[float, List[int]]] = {}
+        for program, _, pids in targets:
+            pids = [pid for pid in pids if pid in alive]
+            if pids:
+                deadline = now + (program.close_timeout if program.close_timeout is not None else self.close_timeout)
+                previous = waiting.get(program, (deadline, []))
+                waiting[program] = (deadline, previous[1] + pids)
+
+        forced: set = set()
+        while waiting:
+            now = time.monotonic()
+            overdue = {pid for deadline, pids in waiting.values() if deadline <= now for pid in pids if pid in alive}
+            if overdue:
+                # Parents first, so a dying helper can't be restarted by its still running parent
+                due = [pid for pid in order if pid in overdue]
+                statuses.update(self.kill_pids(due))
+                forced.update(due)
+                alive.difference_update(due)
+                logging.info(f"Force-ended {len(due)} processes that ignored the close request")
+            waiting = {program: (deadline, [pid for pid in pids if pid in alive]) for program, (deadline, pids) in waiting.items()
+                       if deadline > now and any(pid in alive for pid in pids)}
+            if not waiting:
+                break
+            time.sleep(max(0.0, min(self.poll_interval, min(deadline for deadline, _ in waiting.values()) - time.monotonic())))
+            try:
+                # A PID that now belongs to another image has exited and been reused
+                running = {(process.pid, process.name.lower()) for process in self.backend.list_processes()}
+            except Exception as e:
+                logging.error(f"Error polling the process table: {str(e)}")
+                continue
+            exited = {pid for pid in alive if (pid, names.get(pid)) not in running}
+            for pid in exited:
+                statuses[pid] = EndStatus.ENDED
+            alive.difference_update(exited)
+        return statuses, forced
+
+    def kill_pids(self, pids: List[int]) -> Dict[int, EndStatus]:
+        return self.batched(self._kill_batch, pids)
+
+    def batched(self, action: Callable[[List[int]], Dict[int, EndStatus]], pids: List[int]) -> Dict[int, EndStatus]:
+        batches = [pids[i:i + self.batch_size] for i in range(0, len(pids), self.batch_size)]
+        statuses: Dict[int, EndStatus] = {}
+        if len(batches) <= 1:
+            for batch in batches:
+                statuses.update(action(batch))
+            return statuses
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+            for outcome in pool.map(action, batches):
+                statuses.update(outcome)
+        return statuses
+
+    def _close_batch(self, pids: List[int]) -> Dict[int, EndStatus]:
+        metrics.count("close.pids", len(pids))
+        try:
+            with metrics.timer("close.batch"):
+                statuses = self.backend.close_pids(pids, self.timeout)
+        except Exception as e:
+            # The deadline still applies, survivors are force-killed then
+            logging.error(f"Error closing PIDs {pids}: {str(e)}")
+            return {pid: EndStatus.FAILED for pid in pids}
+        return {pid: statuses.get(pid, EndStatus.FAILED) for pid in pids}
+
+    def _kill_batch(self, pids: List[int]) -> Dict[int, EndStatus]:
+        metrics.count("kill.pids", len(pids))
+        started = time.perf_counter()
+        try:
+            with metrics.timer("kill.batch"):
+                statuses = self.backend.kill_pids(pids, self.timeout)
+            elapsed = time.perf_counter() - started
+            self.batch_latency = elapsed if self.batch_latency is None else 0.8 * self.batch_latency + 0.2 * elapsed
+        except subprocess.TimeoutExpired:
+            logging.error(f"Timed out ending PIDs {pids}")
+            return {pid: EndStatus.TIMED_OUT for pid in pids}
+        except Exception as e:
+            logging.error(f"Error ending PIDs {pids}: {str(e)}")
+            return {pid: EndStatus.FAILED for pid in pids}
+        return {pid: statuses.get(pid, EndStatus.FAILED) for pid in pids}
+
+class StatusProber:
+    def __init__(self, backend: ProcessBackend, max_workers: int = 8, timeout: float = 5.0):
+        self.backend = backend
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+    def query(self, program: "Program") -> bool:
+        with metrics.timer("status.probe"):
+            matcher = program.matcher
+            if not matcher.has_patterns and not matcher.needs_details:
+                return self.backend.query_images(program.processes, self.timeout)
+            # Patterns and constraints can't be expressed as an image filter, so they need the whole table
+            return bool(matcher.match(ProcessSnapshot.capture(self.backend, matcher.needs_details)))
+
+    def probe(self, programs: List["Program"]) -> List[Optional[bool]]:
+        if not programs:
+            return []
+        # Threads are only created as probes start, so this caps nothing but the hung probes left behind
+        pool = ThreadPoolExecutor(max_workers=len(programs))
+        statuses: List[Optional[bool]] = [None] * len(programs)
+        queued = list(range(len(programs)))
+        running: Dict[int, Tuple[object, float]] = {}
+        while queued or running:
+            # Every probe gets its own deadline from the moment it starts, and one that overran gives up its slot,
+            # so a hung probe costs one timeout instead of holding back everything queued behind it
+            while queued and len(running) < self.max_workers:
+                index = queued.pop(0)
+                running[index] = (pool.submit(self.query, programs[index]), time.monotonic() + self.timeout)
+            next_deadline = min(deadline for _, deadline in running.values())
+            done, _ = wait([future for future, _ in running.values()], timeout=max(0.0, next_deadline - time.monotonic()),
+                           return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for index, (future, deadline) in list(running.items()):
+                program = programs[index]
+                if future in done:
+                    del running[index]
+                    if future.exception() is not None:
+                        logging.error(f"Error checking status for {program.name}: {str(future.exception())}")
+                    else:
+                        statuses[index] = bool(future.result())
+                elif now >= deadline:
+                    del running[index]
+                    logging.error(f"Status probe for {program.name} timed out after {self.timeout}s")
+        # Don't wait for hung probes, their subprocess timeout will reap them
+        pool.shutdown(wait=False)
+        return statuses
 
 class Program:
-    def __init__(self, name: str, processes: List[str], path: str = None):
+    __slots__ = ("name", "processes", "path", "close_timeout", "_matcher")
+
+    def __init__(self, name: str, processes: List[Union[str, dict]], path: str = None, close_timeout: float = None):
         self.name = name
         self.processes = processes
         self.path = path
+        self.close_timeout = close_timeout
+        self._matcher: Optional[ProcessMatcher] = None
 
-    def is_running(self) -> bool:
-        for process in self.processes:
+    @property
+    def matcher(self) -> ProcessMatcher:
+        if self._matcher is None:
+            self._matcher = ProcessMatcher([(self, self.processes)])
+        return self._matcher
+
+    @property
+    def process_labels(self) -> str:
+        return ", ".join(rule_label(process) for process in self.processes)
+
+    def is_running(self, snapshot: ProcessSnapshot = None) -> bool:
+        if snapshot is None:
+            snapshot = ProcessSnapshot.capture(details=self.matcher.needs_details)
+        return bool(self.matcher.match(snapshot))
+
+    def end(self, snapshot: ProcessSnapshot = None, backend: ProcessBackend = None, graceful: bool = False) -> TerminationReport:
+        backend = backend or default_process_backend()
+        if snapshot is None:
+            snapshot = ProcessSnapshot.capture(backend, graceful or self.matcher.needs_details)
+        return ProcessTerminator(backend, graceful=graceful).end([self], snapshot)
+
+class ScanProgress(NamedTuple):
+    root: str
+    directories: int
+    files: int
+    matches: int
+    elapsed: float
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.elapsed if self.elapsed > 0 else 0.0
+
+class ScanStats:
+    def __init__(self):
+        self.directories = 0
+        self.files = 0
+        self.matches = 0
+        self.started = time.monotonic()
+        self.cancelled = threading.Event()
+        self.visited = set()
+        self._lock = threading.Lock()
+
+    def add(self, directories: int = 0, files: int = 0, matches: int = 0) -> None:
+        with self._lock:
+            self.directories += directories
+            self.files += files
+            self.matches += matches
+
+    def visit(self, key: Tuple[int, int]) -> bool:
+        # Shared by every unit of a scan, so a junction into another unit's tree is only walked once
+        with self._lock:
+            if key in self.visited:
+                return False
+            self.visited.add(key)
+            return True
+
+    def progress(self, root: str) -> ScanProgress:
+        return ScanProgress(root, self.directories, self.files, self.matches, time.monotonic() - self.started)
+
+def read_directory(directory: str, skip_patterns: List[str] = (), follow_links: bool = False,
+                   extension: str = ".exe", stats: ScanStats = None) -> Tuple[List[str], List[str]]:
+    # Both lists are sorted so every walk visits the tree in the same order
+    files, subdirectories = [], []
+    file_count = 0
+    with os.scandir(directory) as entries:
+        for entry in entries:
             try:
-                result = subprocess.run(["tasklist", "/FI", f"IMAGENAME eq {process}"], capture_output=True, text=True, encoding='utf-8', errors='replace')
-                if result.returncode == 0 and process.lower() in result.stdout.lower():
-                    return True
-            except subprocess.CalledProcessError:
-                logging.error(f"Failed to check if {process} is running")
-        return False
+                if entry.is_dir(follow_symlinks=follow_links):
+                    if any(fnmatch.fnmatchcase(entry.name.lower(), pattern) for pattern in skip_patterns):
+                        logging.debug(f"Skipping directory: {entry.path}")
+                        continue
+                    subdirectories.append(entry.path)
+                else:
+                    file_count += 1
+                    if entry.name.lower().endswith(extension):
+                        files.append(entry.path)
+            except OSError:
+                continue
+    if stats is not None:
+        stats.add(files=file_count)
+    return sorted(files), sorted(subdirectories)
 
-    def end(self) -> None:
-        for process in self.processes:
+def write_json_atomic(path: str, data, indent: int = None) -> None:
+    # Write next to the target and swap it in, so an interrupted save never leaves a truncated file
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=indent)
+    os.replace(temp_path, path)
+
+class ScanCache:
+    VERSION = 1
+
+    def __init__(self, key: str, directories: Dict[str, dict] = None):
+        self.key = key
+        self.previous = directories or {}
+        self.directories: Dict[str, dict] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, path: str, key: str) -> "ScanCache":
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls(key)
+        except (OSError, ValueError) as e:
+            logging.error(f"Ignoring unreadable scan cache {path}: {str(e)}")
+            return cls(key)
+        if data.get("version") != cls.VERSION or data.get("key") != key:
+            logging.info("Scan cache is stale (template or scan settings changed), rescanning everything")
+            return cls(key)
+        return cls(key, data.get("directories", {}))
+
+    def save(self, path: str, partial: bool = False) -> None:
+        # A cancelled scan keeps the entries it did not get to; they are revalidated by mtime on the next scan
+        directories = {**self.previous, **self.directories} if partial else self.directories
+        write_json_atomic(path, {"version": self.VERSION, "key": self.key, "directories": directories})
+
+    def lookup(self, directory: str, mtime_ns: int) -> Optional[Tuple[List[str], List[str]]]:
+        # A directory's mtime only changes when its direct entries change, so subdirectories are still checked one by one
+        entry = self.directories.get(directory) or self.previous.get(directory)
+        if entry is None or entry["mtime"] != mtime_ns:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.directories[directory] = entry
+        return ([os.path.join(directory, name) for name in entry["files"]],
+                [os.path.join(directory, name) for name in entry["dirs"]])
+
+    def store(self, directory: str, mtime_ns: int, files: List[str], subdirectories: List[str]) -> None:
+        self.directories[directory] = {
+            "mtime": mtime_ns,
+            "files": [os.path.basename(file) for file in files],
+            "dirs": [os.path.basename(subdirectory) for subdirectory in subdirectories]
+        }
+
+def list_directory(directory: str, info: os.stat_result, skip_patterns: List[str] = (), follow_links: bool = False,
+                   extension: str = ".exe", cache: ScanCache = None, file_filter: Callable[[str], bool] = None,
+                   stats: ScanStats = None) -> Tuple[List[str], List[str]]:
+    if stats is not None:
+        stats.add(directories=1)
+    listing = cache.lookup(directory, info.st_mtime_ns) if cache is not None else None
+    if listing is not None:
+        if stats is not None:
+            stats.add(files=len(listing[0]))
+        metrics.count("scan.directories.cached")
+        return listing
+    with metrics.timer("scan.directory"):
+        files, subdirectories = read_directory(directory, skip_patterns, follow_links, extension, stats)
+    if file_filter is not None:
+        files = [file for file in files if file_filter(os.path.basename(file))]
+    if cache is not None:
+        cache.store(directory, info.st_mtime_ns, files, subdirectories)
+    return files, subdirectories
+
+def walk_executables(root: str, skip_patterns: Iterable[str] = (), max_depth: int = None,
+                     follow_links: bool = False, extension: str = ".exe", cache: ScanCache = None,
+                     file_filter: Callable[[str], bool] = None, stats: ScanStats = None,
+                     listing: Tuple[List[str], List[str]] = None) -> Iterator[str]:
+    # listing is the root's (files, subdirectories) when the caller already read it
+    skip_patterns = [pattern.lower() for pattern in skip_patterns]
+    stats = stats if stats is not None else ScanStats()
+    stack = [(root, 0, listing)]
+    while stack:
+        if stats.cancelled.is_set():
+            return
+        directory, depth, listing = stack.pop()
+        if listing is None:
             try:
-                subprocess.run(["taskkill", "/IM", process, "/F"], check=True, capture_output=True, encoding='utf-8', errors='replace')
-                logging.info(f"Successfully ended {process}")
-            except subprocess.CalledProcessError as e:
-                logging.error(f"Failed to end {process}: {e.stderr.strip()}")
+                # Junctions and symlinks can point back up the tree, so never enter the same directory twice
+                info = os.stat(directory)
+                if not stats.visit((info.st_dev, info.st_ino)):
+                    logging.debug(f"Skipping already visited directory: {directory}")
+                    continue
+                listing = list_directory(directory, info, skip_patterns, follow_links, extension, cache, file_filter, stats)
+            except OSError as e:
+                logging.debug(f"Cannot scan {directory}: {str(e)}")
+                continue
+        files, subdirectories = listing
+
+        yield from files
+        if max_depth is None or depth < max_depth:
+            stack.extend((subdirectory, depth + 1, None) for subdirectory in reversed(subdirectories))
+
+PE_MACHINES = {0x14C: "x86", 0x8664: "x64", 0xAA64: "arm64", 0x1C4: "arm"}
+VERSION_INFO_FIELDS = {"ProductName": "product_name", "CompanyName": "company", "FileDescription": "file_description",
+                       "FileVersion": "file_version", "ProductVersion": "product_version"}
+RT_VERSION = 16
+
+def parse_version_block(block: bytes) -> dict:
+    # VS_VERSIONINFO is a tree of {wLength, wValueLength, wType, szKey, Value, Children} nodes, each aligned to 4 bytes
+    def node(offset: int) -> Tuple[str, int, int, int, int]:
+        length, value_length, kind = struct.unpack_from("<HHH", block, offset)
+        end = min(offset + length, len(block))
+        key_end = offset + 6
+        while key_end < end and block[key_end:key_end + 2] != b"\0\0":
+            key_end += 2
+        value = (key_end + 5) & ~3
+        children = (value + (value_length * 2 if kind == 1 else value_length) + 3) & ~3
+        return block[offset + 6:key_end].decode("utf-16-le"), value, value_length, children, end
+
+    def children(offset: int, end: int) -> Iterator[int]:
+        while offset + 6 <= end:
+            length = struct.unpack_from("<H", block, offset)[0]
+            if length == 0:
+                return
+            yield offset
+            offset = (offset + length + 3) & ~3
+
+    key, value, value_length, first_child, end = node(0)
+    if key != "VS_VERSION_INFO":
+        return {}
+    info = {}
+    if value_length >= 52 and struct.unpack_from("<I", block, value)[0] == 0xFEEF04BD:
+        file_ms, file_ls, product_ms, product_ls = struct.unpack_from("<IIII", block, value + 8)
+        info["file_version"] = f"{file_ms >> 16}.{file_ms & 0xFFFF}.{file_ls >> 16}.{file_ls & 0xFFFF}"
+        info["product_version"] = f"{product_ms >> 16}.{product_ms & 0xFFFF}.{product_ls >> 16}.{product_ls & 0xFFFF}"
+    for child in children(first_child, end):
+        child_key, _, _, tables, child_end = node(child)
+        if child_key != "StringFileInfo":
+            continue
+        # The first string table (language) wins, and the numeric versions above win over their string forms
+        for table in children(tables, child_end):
+            _, _, _, strings, table_end = node(table)
+            for string in children(strings, table_end):
+                name, text, _, _, string_end = node(string)
+                field = VERSION_INFO_FIELDS.get(name)
+                text = block[text:string_end].decode("utf-16-le", errors="ignore").split("\0")[0].strip()
+                if field and text:
+                    info.setdefault(field, text)
+    return info
+
+def parse_pe_metadata(data) -> Optional[dict]:
+    # Walks DOS header -> PE header -> resource directory (type, name, language) -> VS_VERSIONINFO.
+    # data only needs slicing, so an mmap is read lazily and only the touched pages are loaded.
+    if data[:2] != b"MZ":
+        return None
+    header = struct.unpack_from("<I", data, 0x3C)[0]
+    if data[header:header + 4] != b"PE\0\0":
+        return None
+    machine, section_count, _, _, _, optional_size, _ = struct.unpack_from("<HHIIIHH", data, header + 4)
+    info = {"machine": PE_MACHINES.get(machine, f"{machine:#x}")}
+    optional = header + 24
+    magic = struct.unpack_from("<H", data, optional)[0]
+    if magic not in (0x10B, 0x20B):
+        return info
+    directories = optional + (96 if magic == 0x10B else 112)
+    if struct.unpack_from("<I", data, directories - 4)[0] <= 2:
+        return info
+    resource_rva = struct.unpack_from("<I", data, directories + 16)[0]
+    if not resource_rva:
+        return info
+    sections = [struct.unpack_from("<IIII", data, optional + optional_size + 40 * i + 8) for i in range(section_count)]
+
+    def offset_of(rva: int) -> int:
+        for virtual_size, virtual_address, raw_size, raw_pointer in sections:
+            if virtual_address <= rva < virtual_address + max(virtual_size, raw_size):
+                return rva - virtual_address + raw_pointer
+        raise ValueError(f"RVA {rva:#x} is outside all sections")
+
+    base = offset_of(resource_rva)
+    entry = base
+    for level, wanted in enumerate((RT_VERSION, None, None)):
+        named, ids = struct.unpack_from("<HH", data, entry + 12)
+        for i in range(named + ids):
+            ident, target = struct.unpack_from("<II", data, entry + 16 + 8 * i)
+            if wanted is None or ident == wanted:
+                break
+        else:
+            return info
+        # Type and name entries point at subdirectories, language entries at the data itself
+        if bool(target & 0x80000000) != (level < 2):
+            raise ValueError("malformed resource directory")
+        entry = base + (target & 0x7FFFFFFF)
+    rva, size = struct.unpack_from("<II", data, entry)
+    start = offset_of(rva)
+    info.update(parse_version_block(bytes(data[start:start + size])))
+    return info
+
+def read_version_info(path: str) -> Optional[dict]:
+    import mmap
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < 64:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return parse_pe_metadata(data)
+    except (OSError, ValueError, struct.error) as e:
+        logging.debug(f"Cannot read version info of {path}: {str(e)}")
+        return None
+
+class VersionInfoCache:
+    VERSION = 1
+
+    def __init__(self, entries: Dict[str, dict] = None):
+        self.previous = entries or {}
+        self.entries: Dict[str, dict] = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "VersionInfoCache":
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls()
+        except (OSError, ValueError) as e:
+            logging.error(f"Ignoring unreadable version info cache {path}: {str(e)}")
+            return cls()
+        if data.get("version") != cls.VERSION:
+            return cls()
+        return cls(data.get("files", {}))
+
+    def save(self, path: str, partial: bool = False) -> None:
+        files = {**self.previous, **self.entries} if partial else self.entries
+        write_json_atomic(path, {"version": self.VERSION, "files": files})
+
+    def read(self, path: str) -> Optional[dict]:
+        # Binaries are only parsed again when their size or modification time changed
+        try:
+            info = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self.entries.get(path) or self.previous.get(path)
+            if entry is not None and entry["size"] == info.st_size and entry["mtime"] == info.st_mtime_ns:
+                self.hits += 1
+                self.entries[path] = entry
+                return entry["info"]
+            self.misses += 1
+        with metrics.timer("scan.version_info"):
+            version_info = read_version_info(path)
+        with self._lock:
+            self.entries[path] = {"size": info.st_size, "mtime": info.st_mtime_ns, "info": version_info}
+        return version_info
+
+def normalize_name(text: str) -> str:
+    return re.sub(r"[^0-9a-z]", "", text.casefold())
+
+def version_score(program: str, expected: Optional[dict], version_info: Optional[dict]) -> Optional[int]:
+    # None rejects the file for the program; otherwise the higher score wins when files or programs compete.
+    # 2: every "version_match" pattern of the template matched, 1: the product or description names the program.
+    if version_info is None:
+        return 0
+    if expected:
+        for field, pattern in expected.items():
+            if not fnmatch.fnmatchcase(str(version_info.get(field, "")).casefold(), pattern.casefold()):
+                return None
+        return 2
+    name = normalize_name(program)
+    for field in ("product_name", "file_description"):
+        value = normalize_name(version_info.get(field, ""))
+        if value and (name in value or value in name):
+            return 1
+    return 0
+
+class ScanMatch(NamedTuple):
+    category: str
+    program: str
+    path: str
+    version_info: Optional[dict] = None
+    score: int = 0
+
+class ScanUnit(NamedTuple):
+    root: str
+    directory: str
+    max_depth: Optional[int]
+    listing: Optional[Tuple[List[str], List[str]]] = None
+
+class ProgramScanner:
+    def __init__(self, template: Dict[str, Dict[str, dict]], skip_patterns: Iterable[str] = (), max_depth: int = None,
+                 workers: int = 8, follow_links: bool = False, cache: ScanCache = None, version_cache: VersionInfoCache = None):
+        self.matcher = ProcessMatcher(((category, program), details["processes"])
+                                      for category, programs in template.items() for program, details in programs.items())
+        self.expected_versions = {(category, program): details["version_match"] for category, programs in template.items()
+                                  for program, details in programs.items() if details.get("version_match")}
+        self.version_cache = version_cache
+        self.skip_patterns = [pattern.lower() for pattern in skip_patterns]
+        self.max_depth = max_depth
+        self.workers = workers
+        self.follow_links = follow_links
+        self.cache = cache
+        self.stats = ScanStats()
+
+    def cache_key(self, template: Dict[str, Dict[str, dict]]) -> str:
+        # Any change to the template or to what the walker would list invalidates the whole cache
+        settings = {"template": template, "skip": self.skip_patterns, "max_depth": self.max_depth, "follow_links": self.follow_links}
+        return hashlib.sha1(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def is_candidate(self, filename: str) -> bool:
+        return self.matcher.is_candidate(filename)
+
+    def units(self, roots: List[str]) -> List[ScanUnit]:
+        # Each root is split into its own files (depth 0) plus one unit per top-level subdirectory.
+        # Units are listed in the order a single-threaded walk would reach them.
+        # The root unit reuses the listing read here, so no directory is listed twice.
+        units = []
+        for root in roots:
+            try:
+                info = os.stat(root)
+                if not self.stats.visit((info.st_dev, info.st_ino)):
+                    logging.debug(f"Skipping already visited directory: {root}")
+                    continue
+                listing = list_directory(root, info, self.skip_patterns, self.follow_links,
+                                         cache=self.cache, file_filter=self.is_candidate, stats=self.stats)
+            except OSError as e:
+                logging.debug(f"Cannot scan {root}: {str(e)}")
+                continue
+            units.append(ScanUnit(root, root, 0, listing))
+            if self.max_depth is not None and self.max_depth < 1:
+                continue
+            units.extend(ScanUnit(root, subdirectory, None if self.max_depth is None else self.max_depth - 1) for subdirectory in listing[1])
+        return units
+
+    def scan_unit(self, unit: ScanUnit) -> List[ScanMatch]:
+        matches = []
+        for file in walk_executables(unit.directory, self.skip_patterns, unit.max_depth, self.follow_links,
+                                     cache=self.cache, file_filter=self.is_candidate, stats=self.stats, listing=unit.listing):
+            logging.debug(f"Found executable: {file}")
+            owners = self.matcher.match_file(file)
+            if owners and self.version_cache is not None:
+                version_info = self.version_cache.read(file)
+                matches.extend(ScanMatch(category, program, file, version_info, score) for (category, program), score in self.resolve(owners, version_info))
+            else:
+                matches.extend(ScanMatch(category, program, file) for category, program in owners)
+        self.stats.add(matches=len(matches))
+        return matches
+
+    def resolve(self, owners: List[Tuple[str, str]], version_info: Optional[dict]) -> List[Tuple[Tuple[str, str], int]]:
+        # A shared image name such as updater.exe only goes to the programs its version resource points at
+        scored = [(owner, version_score(owner[1], self.expected_versions.get(owner), version_info)) for owner in owners]
+        scored = [(owner, score) for owner, score in scored if score is not None]
+        best = max((score for _, score in scored), default=0)
+        return [(owner, score) for owner, score in scored if score == best]
+
+    def iter_scan(self, roots: List[str], progress_interval: float = 0.1) -> Iterator[Union[ScanMatch, ScanProgress]]:
+        self.stats = ScanStats()
+        units = self.units(roots)
+        pool = ThreadPoolExecutor(max_workers=max(1, self.workers))
+        futures = [pool.submit(self.scan_unit, unit) for unit in units]
+        try:
+            # Units are consumed in order, so the merged stream matches a sequential scan
+            for unit, future in zip(units, futures):
+                while True:
+                    try:
+                        matches = future.result(timeout=progress_interval)
+                        break
+                    except FutureTimeoutError:
+                        yield self.stats.progress(unit.root)
+                yield self.stats.progress(unit.root)
+                yield from matches
+        finally:
+            # Stops running walkers at their next directory when the consumer cancels
+            self.stats.cancelled.set()
+            for future in futures:
+                future.cancel()
+            pool.shutdown(wait=True)
+
+    def scan(self, roots: List[str]) -> List[ScanMatch]:
+        return [event for event in self.iter_scan(roots) if isinstance(event, ScanMatch)]
+
+class StatusBoard:
+    # Running PIDs per program, kept up to date from snapshot diffs: only programs owning a started or exited
+    # image are matched again, so an update costs as much as what changed, not as much as the catalog
+    def __init__(self, programs: List[Program], matcher: ProcessMatcher = None):
+        self.programs = programs
+        self.tracked = set(programs)
+        self.matcher = matcher or ProcessMatcher((program, program.processes) for program in programs)
+        self.snapshot: Optional[ProcessSnapshot] = None
+        self.pids: Dict[Program, List[int]] = {}
+        self.version = 0
+
+    def update(self, snapshot: ProcessSnapshot) -> set:
+        if snapshot is self.snapshot:
+            return set()
+        if self.snapshot is None:
+            owners = self.matcher.owners(snapshot)
+            self.pids = {program: sorted({process.pid for process in processes}) for program, processes in owners.items()}
+            changed = set(self.programs)
+        else:
+            started, exited = snapshot.diff(self.snapshot)
+            affected = {self.matcher.rules[index].owner for process in started + exited for index in self.matcher.rules_for_name(process.name)}
+            changed = set()
+            for program in affected:
+                pids = sorted({process.pid for processes in program.matcher.match(snapshot).values() for process in processes})
+                if pids != self.pids.get(program, []):
+                    changed.add(program)
+                    if pids:
+                        self.pids[program] = pids
+                    else:
+                        self.pids.pop(program, None)
+        self.snapshot = snapshot
+        if changed:
+            self.version += 1
+        return changed
+
+    def is_running(self, program: Program) -> bool:
+        return program in self.pids
+
+class KillProfile(NamedTuple):
+    name: str
+    categories: List[str] = []
+    programs: List[str] = []
+
+    def to_json(self) -> dict:
+        return {"categories": self.categories, "programs": self.programs}
+
+class KillPlan:
+    # A profile resolved against the current programs: deduplicated programs and one compiled matcher, built once per config
+    def __init__(self, profile: KillProfile, selected: List[Tuple[str, str, Program]]):
+        self.profile = profile
+        self.entries = list({id(program): (category, name, program) for category, name, program in selected}.values())
+        self.programs = [program for _, _, program in self.entries]
+        self.matcher = ProcessMatcher((program, program.processes) for program in self.programs)
+
+    @property
+    def images(self) -> List[str]:
+        return list(dict.fromkeys(rule.label for rule in self.matcher.rules))
+
+class ProgramCatalog:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, position INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS programs (
+            id INTEGER PRIMARY KEY, category_id INTEGER NOT NULL REFERENCES categories(id) ON DELETE CASCADE,
+            name TEXT NOT NULL, position INTEGER NOT NULL, close_timeout REAL, UNIQUE (category_id, name));
+        CREATE TABLE IF NOT EXISTS process_images (
+            program_id INTEGER NOT NULL REFERENCES programs(id) ON DELETE CASCADE,
+            image TEXT NOT NULL, position INTEGER NOT NULL, PRIMARY KEY (program_id, image));
+        CREATE INDEX IF NOT EXISTS process_images_image ON process_images (image COLLATE NOCASE);
+        CREATE TABLE IF NOT EXISTS scan_runs (
+            id INTEGER PRIMARY KEY, user TEXT NOT NULL, started_at REAL NOT NULL, finished_at REAL,
+            programs_found INTEGER NOT NULL DEFAULT 0, cancelled INTEGER NOT NULL DEFAULT 0);
+        CREATE TABLE IF NOT EXISTS discovered_paths (
+            program_id INTEGER NOT NULL REFERENCES programs(id) ON DELETE CASCADE, user TEXT NOT NULL,
+            path TEXT NOT NULL, scan_id INTEGER NOT NULL REFERENCES scan_runs(id), found_at REAL NOT NULL, version_info TEXT,
+            PRIMARY KEY (program_id, user));
+        CREATE INDEX IF NOT EXISTS discovered_paths_user ON discovered_paths (user);
+    """
+
+    def __init__(self, path: str):
+        import sqlite3
+        self.path = path
+        # Callers serialize access themselves (the fleet agent runs commands one at a time on worker threads)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(self.SCHEMA)
+        # Catalogs created before version info was recorded get the column added in place
+        if "version_info" not in {row[1] for row in self.connection.execute("PRAGMA table_info(discovered_paths)")}:
+            self.connection.execute("ALTER TABLE discovered_paths ADD COLUMN version_info TEXT")
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self.connection:
+            self.connection.execute("INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value", (key, value))
+
+    def import_template(self, template: Dict[str, Dict[str, dict]]) -> None:
+        # The catalog mirrors the template: entries that left programs.json are removed along with their discovered paths
+        with self.connection:
+            db = self.connection
+            for category_position, (category, programs) in enumerate(template.items()):
+                db.execute("INSERT INTO categories (name, position) VALUES (?, ?) "
+                           "ON CONFLICT (name) DO UPDATE SET position = excluded.position", (category, category_position))
+                category_id = db.execute("SELECT id FROM categories WHERE name = ?", (category,)).fetchone()[0]
+                for program_position, (program, details) in enumerate(programs.items()):
+                    db.execute("INSERT INTO programs (category_id, name, position, close_timeout) VALUES (?, ?, ?, ?) "
+                               "ON CONFLICT (category_id, name) DO UPDATE SET position = excluded.position, close_timeout = excluded.close_timeout",
+                               (category_id, program, program_position, details.get("close_timeout")))
+                    program_id = db.execute("SELECT id FROM programs WHERE category_id = ? AND name = ?", (category_id, program)).fetchone()[0]
+                    db.execute("DELETE FROM process_images WHERE program_id = ?", (program_id,))
+                    db.executemany("INSERT INTO process_images (program_id, image, position) VALUES (?, ?, ?)",
+                                   [(program_id, json.dumps(entry, sort_keys=True) if isinstance(entry, dict) else entry, position)
+                                    for position, entry in enumerate(details["processes"])])
+                db.execute(f"DELETE FROM programs WHERE category_id = ? AND name NOT IN ({', '.join('?' * len(programs))})",
+                           (category_id, *programs))
+            db.execute(f"DELETE FROM categories WHERE name NOT IN ({', '.join('?' * len(template))})", tuple(template))
+
+    def export_json(self, user: str = None) -> Dict[str, Dict[str, dict]]:
+        # Same shape as programs.json, or as programs_db_<user>.json when a user is given
+        config: Dict[str, Dict[str, dict]] = {}
+        for (category,) in self.connection.execute("SELECT name FROM categories ORDER BY position"):
+            config[category] = {}
+        rows = self.connection.execute("""
+            SELECT c.name, p.name, p.close_timeout, i.image, d.path, d.version_info
+            FROM programs p
+            JOIN categories c ON c.id = p.category_id
+            JOIN process_images i ON i.program_id = p.id
+            LEFT JOIN discovered_paths d ON d.program_id = p.id AND d.user = ?
+            WHERE ? IS NULL OR d.path IS NOT NULL
+            ORDER BY c.position, p.position, i.position
+        """, (user, user))
+        for category, program, close_timeout, image, path, version_info in rows:
+            entry = config[category].setdefault(program, {"processes": []})
+            if close_timeout is not None:
+                entry["close_timeout"] = close_timeout
+            # Rules with constraints are stored as their JSON object; plain names stay indexable
+            entry["processes"].append(json.loads(image) if image.startswith("{") else image)
+            if path is not None:
+                entry["path"] = path
+            if version_info is not None:
+                entry["version_info"] = json.loads(version_info)
+        return config
+
+    def has_scans(self, user: str) -> bool:
+        return self.connection.execute("SELECT 1 FROM scan_runs WHERE user = ? AND finished_at IS NOT NULL LIMIT 1", (user,)).fetchone() is not None
+
+    def begin_scan(self, user: str) -> int:
+        with self.connection:
+            return self.connection.execute("INSERT INTO scan_runs (user, started_at) VALUES (?, ?)", (user, time.time())).lastrowid
+
+    def record_match(self, scan_id: int, user: str, category: str, program: str, path: str, version_info: dict = None) -> None:
+        # Committed together with finish_scan, or at the latest when the scan is cancelled
+        self.connection.execute("""
+            INSERT INTO discovered_paths (program_id, user, path, scan_id, found_at, version_info)
+            SELECT p.id, ?, ?, ?, ?, ? FROM programs p JOIN categories c ON c.id = p.category_id WHERE c.name = ? AND p.name = ?
+            ON CONFLICT (program_id, user) DO UPDATE SET path = excluded.path, scan_id = excluded.scan_id, found_at = excluded.found_at,
+                                                         version_info = excluded.version_info
+        """, (user, path, scan_id, time.time(), None if version_info is None else json.dumps(version_info, sort_keys=True), category, program))
+
+    def finish_scan(self, scan_id: int, user: str, programs_found: int, cancelled: bool) -> None:
+        with self.connection:
+            if not cancelled:
+                # A complete scan is authoritative; a cancelled one keeps what earlier scans found
+                self.connection.execute("DELETE FROM discovered_paths WHERE user = ? AND scan_id != ?", (user, scan_id))
+            self.connection.execute("UPDATE scan_runs SET finished_at = ?, programs_found = ?, cancelled = ? WHERE id = ?",
+                                    (time.time(), programs_found, int(cancelled), scan_id))
+
+    def lookup_image(self, image: str) -> List[Tuple[str, str]]:
+        return self.connection.execute("""
+            SELECT c.name, p.name FROM process_images i
+            JOIN programs p ON p.id = i.program_id JOIN categories c ON c.id = p.category_id
+            WHERE i.image = ? COLLATE NOCASE ORDER BY c.position, p.position
+        """, (image,)).fetchall()
+
+    def category_programs(self, category: str) -> List[str]:
+        return [name for (name,) in self.connection.execute(
+            "SELECT p.name FROM programs p JOIN categories c ON c.id = p.category_id WHERE c.name = ? ORDER BY p.position", (category,))]
+
+    def discovered(self, program: str = None) -> List[Tuple[str, str, str, str]]:
+        return self.connection.execute("""
+            SELECT d.user, c.name, p.name, d.path FROM discovered_paths d
+            JOIN programs p ON p.id = d.program_id JOIN categories c ON c.id = p.category_id
+            WHERE ? IS NULL OR p.name = ? ORDER BY d.user, c.position, p.position
+        """, (program, program)).fetchall()
 
 class ProgramManager:
-    def __init__(self, config_file: str = "programs.json"):
+    CONFIG_CACHE_VERSION = 1
+    CONFIG_CACHE_FILE = "data/config_cache_{user}.bin"
+    DEFAULT_ONLINE_PRESENCE_CATEGORIES = ["Communication", "Gaming Platforms"]
+    MENU_ACTIONS = {"1": "end programs", "2": "end categories", "3": "list programs", "4": "scan programs", "5": "help", "6": "free memory",
+                    "7": "run profile", "8": "dashboard", "9": "end online presence"}
+    SORT_KEYS = ["name", "memory", "cpu"]
+
+    def __init__(self, config_file: str = "programs.json", process_backend: ProcessBackend = None, snapshot_ttl: float = 2.0,
+                 concurrent_probes: bool = False, probe_workers: int = 8, probe_timeout: float = 5.0, scan_workers: int = 8,
+                 full_rescan: bool = False, catalog_file: str = None, graceful: bool = False, close_timeout: float = 5.0,
+                 sort_by: str = "name", dashboard_interval: float = 1.0, scan_metadata: bool = False):
         self.template_file = config_file
         self.user = getpass.getuser()
         self.user_config_file = f"data/programs_db_{self.user}.json"
+        self.paths_file = "data/programs_default_paths.json"
+        self.config_cache_file = self.CONFIG_CACHE_FILE.format(user=self.user)
+        self.profiles_file = f"data/profiles_{self.user}.json"
+        self.scan_workers = scan_workers
+        self.full_rescan = full_rescan
+        self.scan_metadata = scan_metadata
+        self.sort_by = sort_by
+        self.dashboard_interval = dashboard_interval
         self.programs: Dict[str, Dict[str, Program]] = {}
-        self.online_presence_categories: List[str] = []
+        self.online_presence_categories: List[str] = list(self.DEFAULT_ONLINE_PRESENCE_CATEGORIES)
+        self.process_table = ProcessTable(process_backend, ttl=snapshot_ttl)
+        self.terminator = ProcessTerminator(self.process_table.backend, graceful=graceful, close_timeout=close_timeout)
+        self.status_prober = StatusProber(self.process_table.backend, probe_workers, probe_timeout) if concurrent_probes else None
+        self.catalog = ProgramCatalog(catalog_file) if catalog_file else None
         self.load_config()
 
+    def current_snapshot(self, tree: bool = False) -> Optional[ProcessSnapshot]:
+        # Parent PIDs and CPU times only come with the detailed listing on Windows, so process trees and CPU sorting ask for it
+        try:
+            self.process_table.details = self.matcher.needs_details or (tree and self.terminator.graceful) or self.sort_by == "cpu"
+            return self.process_table.snapshot()
+        except Exception as e:
+            logging.error(f"Error capturing process snapshot: {str(e)}")
+            return None
+
     def load_config(self) -> None:
         try:
-            if os.path.exists(self.user_config_file):
-                with open(self.user_config_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-            else:
-                with open(self.template_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-            
-            for category, programs in config.items():
-                self.programs[category] = {}
-                for name, details in programs.items():
-                    self.programs[category][name] = Program(name, details["processes"], details.get("path"))
+            with metrics.timer("config.load"):
+                if self.catalog is not None:
+                    self.sync_catalog_template()
+                    config = self.catalog.export_json(self.user if self.catalog.has_scans(self.user) else None)
+                else:
+                    source = self.user_config_file if os.path.exists(self.user_config_file) else self.template_file
+                    config = self.read_compiled_config(source)
+            self.set_programs(config)
             logging.info(f"Loaded {sum(len(progs) for progs in self.programs.values())} programs from {len(self.programs)} categories")
         except FileNotFoundError:
             logging.error(f"Config file not found.")
@@ -83,8 +1621,78 @@ class ProgramManager:
         except json.JSONDecodeError:
             logging.error(f"Error decoding config file. Please ensure it's a valid JSON file.")
             exit(1)
+        except re.error as e:
+            logging.error(f"Error in config file: {str(e)}")
+            exit(1)
+
+    def sync_catalog_template(self) -> None:
+        # programs.json stays the authoring format; it is re-imported whenever it changes on disk
+        info = os.stat(self.template_file)
+        key = f"{os.path.abspath(self.template_file)}:{info.st_mtime_ns}:{info.st_size}"
+        if self.catalog.get_meta("template") == key:
+            return
+        with open(self.template_file, 'r', encoding='utf-8') as f:
+            self.catalog.import_template(json.load(f))
+        self.catalog.set_meta("template", key)
+        logging.info(f"Imported {self.template_file} into {self.catalog.path}")
+
+    def import_user_config(self) -> int:
+        # Moves the paths of an existing programs_db_<user>.json into the catalog as one complete scan
+        with open(self.user_config_file, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        scan_id = self.catalog.begin_scan(self.user)
+        imported = 0
+        for category, programs in config.items():
+            for program, details in programs.items():
+                if details.get("path"):
+                    self.catalog.record_match(scan_id, self.user, category, program, details["path"])
+                    imported += 1
+        self.catalog.finish_scan(scan_id, self.user, imported, cancelled=False)
+        logging.info(f"Imported {imported} paths from {self.user_config_file} into {self.catalog.path}")
+        return imported
+
+    def set_programs(self, config: Dict[str, Dict[str, dict]]) -> None:
+        self.programs = {
+            category: {name: Program(name, details["processes"], details.get("path"), details.get("close_timeout")) for name, details in programs.items()}
+            for category, programs in config.items()
+        }
+        self.matcher = ProcessMatcher((program, program.processes) for programs in self.programs.values() for program in programs.values())
+        # Menu option number -> entry, built once instead of counting through the nested dicts on every selection
+        self.program_options: Dict[int, Tuple[str, str, Program]] = dict(enumerate(
+            ((category, name, program) for category, programs in self.programs.items() for name, program in programs.items()), start=1))
+        self.category_options: Dict[int, str] = dict(enumerate(self.programs, start=1))
+        self.plans: Dict[str, KillPlan] = {}
+        self.status_board = StatusBoard([program for _, _, program in self.program_options.values()], self.matcher)
+
+    def read_compiled_config(self, source: str) -> Dict[str, Dict[str, dict]]:
+        # The marshal cache is only trusted while the JSON it was compiled from has the same path, mtime and size
+        try:
+            info = os.stat(source)
+            key = (self.CONFIG_CACHE_VERSION, os.path.abspath(source), info.st_mtime_ns, info.st_size)
+        except OSError:
+            key = None
+        if key is not None:
+            try:
+                with open(self.config_cache_file, 'rb') as f:
+                    cached_key, config = marshal.loads(f.read())
+                if tuple(cached_key) == key:
+                    logging.debug(f"Loaded compiled config for {source}")
+                    return config
+            except Exception:
+                pass
+
+        with open(source, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        if key is not None:
+            try:
+                with open(self.config_cache_file, 'wb') as f:
+                    marshal.dump((key, config), f)
+            except Exception as e:
+                logging.debug(f"Could not write compiled config {self.config_cache_file}: {str(e)}")
+        return config
             
     def display_menu(self) -> None:
+        from rich.table import Table
         table = Table(title="Main Menu")
         table.add_column("Option", style="cyan", no_wrap=True)
         table.add_column("Description", style="magenta")
@@ -95,6 +1703,10 @@ class ProgramManager:
             ("3", "List programs by category"),
             ("4", "Scan programs on local machine"),
             ("5", "Help"),
+            ("6", "Free memory"),
+            ("7", "Run a profile"),
+            ("8", "Live dashboard"),
+            ("9", "End online presence"),
             ("0", "Exit")
         ]
 
@@ -110,67 +1722,176 @@ class ProgramManager:
         console.print("[magenta] 3. List programs by category:[/magenta] View all programs organized by their categories.")
         console.print("[magenta] 4. Scan programs on local machine:[/magenta] Scan the system for installed programs and update the configuration.")
         console.print("[magenta] 5. Help:[/magenta] Display this help section.")
+        console.print("[magenta] 6. Free memory:[/magenta] End the programs using the most memory, either the top N or until a target amount is freed.")
+        console.print("[magenta] 7. Run a profile:[/magenta] Preview and run a saved set of categories and programs to end.")
+        console.print("[magenta] 8. Live dashboard:[/magenta] Keep the program statuses on screen, updated as programs start and exit. Ctrl+C returns to the menu.")
+        console.print("[magenta] 9. End online presence:[/magenta] End every program in the Communication and Gaming Platforms categories.")
         console.print("[magenta] 0. Exit:[/magenta] Close the Program Manager.")
         console.print()
         console.print("[yellow] > For further information regarding the scripts functionality, refer to the [cyan]README.md[/cyan] file.[/yellow]")
         console.print()
 
+    def probe_running(self, programs: List[Program]) -> List[Optional[bool]]:
+        metrics.count("programs.touched", len(programs))
+        if self.status_prober is not None:
+            return self.status_prober.probe(programs)
+        snapshot = self.current_snapshot()
+        if snapshot is None:
+            return [None] * len(programs)
+        # Between two prompts usually only the programs just ended changed, so the board only re-matches those
+        running = self.matched_processes(programs, snapshot)
+        return [program in running for program in programs]
+
+    def probe_statuses(self, programs: List[Program]) -> List[str]:
+        statuses = []
+        for is_running in self.probe_running(programs):
+            if is_running is None:
+                statuses.append("[yellow]Unknown[/yellow]")
+            else:
+                statuses.append("[green]Running[/green]" if is_running else "[red]Offline[/red]")
+        return statuses
+
+    def matched_processes(self, programs: List[Program], snapshot: ProcessSnapshot) -> Dict[Program, List[ProcessInfo]]:
+        # Catalog programs come from the status board, which only re-matches programs whose images started or exited;
+        # only programs from outside the catalog need a matcher of their own
+        self.status_board.update(snapshot)
+        by_pid = {process.pid: process for process in snapshot.processes}
+        owners, others = {}, []
+        for program in programs:
+            if program not in self.status_board.tracked:
+                others.append(program)
+            elif program in self.status_board.pids:
+                owners[program] = [by_pid[pid] for pid in self.status_board.pids[program]]
+        if others:
+            owners.update(ProcessMatcher((program, program.processes) for program in others).owners(snapshot))
+        return owners
+
+    def program_processes(self, programs: List[Program], snapshot: ProcessSnapshot) -> Dict[Program, List[ProcessInfo]]:
+        # With --graceful a program's helpers are ended with it, so they count towards its resource use too
+        owners = self.matched_processes(programs, snapshot)
+        if self.terminator.graceful:
+            return {program: snapshot.descendants(processes) for program, processes in owners.items()}
+        return owners
+
+    def resource_usage(self, snapshot: Optional[ProcessSnapshot] = None) -> Tuple[Dict[Program, ResourceUsage], Dict[str, ResourceUsage]]:
+        snapshot = snapshot or self.current_snapshot()
+        if snapshot is None:
+            return {}, {}
+        processes = self.program_processes([program for programs in self.programs.values() for program in programs.values()], snapshot)
+        by_program = {program: ResourceUsage.of(program_processes) for program, program_processes in processes.items()}
+        by_category = {
+            category: ResourceUsage.of(process for program in programs.values() for process in processes.get(program, ()))
+            for category, programs in self.programs.items()
+        }
+        return by_program, by_category
+
+    def table_state(self) -> Tuple[List[str], Optional[Dict[Program, ResourceUsage]], Optional[Dict[str, ResourceUsage]]]:
+        # Statuses in catalog order plus the usage columns; usage is None when it could not be read in time
+        programs = [program for programs in self.programs.values() for program in programs.values()]
+        if self.status_prober is None:
+            statuses = self.probe_statuses(programs)
+            usage, category_usage = self.resource_usage()
+            return statuses, usage, category_usage
+        # --concurrent-probes promises a table within the probe timeout, so the full listing behind the usage columns
+        # runs alongside the probes under the same deadline instead of blocking the render
+        pool = ThreadPoolExecutor(max_workers=1)
+        listing = pool.submit(self.current_snapshot)
+        started = time.monotonic()
+        statuses = self.probe_statuses(programs)
+        try:
+            snapshot = listing.result(timeout=max(0.0, self.status_prober.timeout - (time.monotonic() - started)))
+        except FutureTimeoutError:
+            logging.error(f"Process listing for the usage columns timed out after {self.status_prober.timeout}s")
+            snapshot = None
+        finally:
+            pool.shutdown(wait=False)
+        if snapshot is None:
+            return statuses, None, None
+        usage, category_usage = self.resource_usage(snapshot)
+        return statuses, usage, category_usage
+
+    def usage_cells(self, usage: Optional[Dict[Program, ResourceUsage]], program: Program) -> Tuple[str, str]:
+        if usage is None:
+            return "[yellow]Unknown[/yellow]", "[yellow]Unknown[/yellow]"
+        program_usage = usage.get(program)
+        if program_usage is None:
+            return "", ""
+        return format_size(program_usage.memory), format_cpu_time(program_usage.cpu_time)
+
+    def sort_key(self, usage: Optional[ResourceUsage]):
+        # Stable sort on a negated key keeps the template order for ties and for "name"
+        if self.sort_by == "memory":
+            return -(usage.memory if usage else 0)
+        if self.sort_by == "cpu":
+            return -((usage.cpu_time or 0) if usage else 0)
+        return 0
+
     def list_programs(self) -> None:
+        from rich.table import Table
         table = Table(title="Programs")
         table.add_column("Option", style="cyan", no_wrap=True)
         table.add_column("Category", style="yellow")
         table.add_column("Program", style="magenta")
         table.add_column("Processes", style="blue")
+        table.add_column("Memory", style="green", justify="right")
+        table.add_column("CPU", style="green", justify="right")
         table.add_column("Status", style="bold")
 
-        option = 1
-        for category, programs in self.programs.items():
-            for name, program in programs.items():
-                try:
-                    is_running = program.is_running()
-                    status = "[green]Running[/green]" if is_running else "[red]Offline[/red]"
-                except Exception as e:
-                    logging.error(f"Error checking status for {name}: {str(e)}")
-                    status = "[yellow]Unknown[/yellow]"
-                table.add_row(
-                    str(option),
-                    category,
-                    name,
-                    ", ".join(program.processes),
-                    status
-                )
-                option += 1
-            table.add_section()
+        statuses, usage, _ = self.table_state()
+        statuses = iter(statuses)
+        rows = [(option, category, name, program, next(statuses)) for option, (category, name, program) in self.program_options.items()]
 
-        table.add_row("0", "Back to Main Menu", "", "", "")
+        # Option numbers stay attached to their program, so sorting never changes what a number ends
+        sorted_rows = sorted(rows, key=lambda row: self.sort_key((usage or {}).get(row[3])))
+        for index, (option, category, name, program, status) in enumerate(sorted_rows):
+            memory, cpu_time = self.usage_cells(usage, program)
+            table.add_row(
+                str(option),
+                category,
+                name,
+                program.process_labels,
+                memory,
+                cpu_time,
+                status
+            )
+            if self.sort_by == "name" and (index + 1 == len(sorted_rows) or sorted_rows[index + 1][1] != category):
+                table.add_section()
+
+        table.add_row("0", "Back to Main Menu", "", "", "", "", "")
         console.print(table)
         console.print()
 
     def list_categories(self) -> None:
+        from rich.table import Table
         table = Table(title="Program Categories")
         table.add_column("Option", style="cyan", no_wrap=True)
         table.add_column("Category", style="yellow")
         table.add_column("Program", style="magenta")
         table.add_column("Processes", style="blue")
+        table.add_column("Memory", style="green", justify="right")
+        table.add_column("CPU", style="green", justify="right")
         table.add_column("Status", style="bold")
 
-        option = 1
-        for category, programs in self.programs.items():
+        statuses, usage, category_usage = self.table_state()
+        statuses = iter(statuses)
+        category_usage = category_usage or {}
+        groups = [(option, category, [(name, program, next(statuses)) for name, program in self.programs[category].items()])
+                  for option, category in self.category_options.items()]
+
+        for option, category, rows in sorted(groups, key=lambda group: self.sort_key(category_usage.get(group[1]))):
+            total = category_usage.get(category)
             first_program = True
-            for name, program in programs.items():
-                try:
-                    is_running = program.is_running()
-                    status = "[green]Running[/green]" if is_running else "[red]Offline[/red]"
-                except Exception as e:
-                    logging.error(f"Error checking status for {name}: {str(e)}")
-                    status = "[yellow]Unknown[/yellow]"
-                
+            for name, program, status in sorted(rows, key=lambda row: self.sort_key((usage or {}).get(row[1]))):
+                memory, cpu_time = self.usage_cells(usage, program)
+
                 if first_program:
                     table.add_row(
                         str(option),
-                        category,
+                        category + (f" ({format_size(total.memory)})" if total and total.processes else ""),
                         name,
-                        ", ".join(program.processes),
+                        program.process_labels,
+                        memory,
+                        cpu_time,
                         status
                     )
                     first_program = False
@@ -179,17 +1900,45 @@ class ProgramManager:
                         "",
                         "",
                         name,
-                        ", ".join(program.processes),
+                        program.process_labels,
+                        memory,
+                        cpu_time,
                         status
                     )
             
             table.add_section()
-            option += 1
 
-        table.add_row("0", "Back to Main Menu", "", "", "")
+        table.add_row("0", "Back to Main Menu", "", "", "", "", "")
         console.print(table)
 
+    def end_selected(self, programs: List[Program]) -> Optional[TerminationReport]:
+        snapshot = self.current_snapshot(tree=True)
+        if snapshot is None:
+            console.print()
+            console.print("[red]✗ Could not read the process table[/red]")
+            return None
+        metrics.count("programs.touched", len(programs))
+        report = self.terminator.end(programs, snapshot)
+        self.process_table.invalidate()
+        self.print_termination_report(report)
+        return report
+
+    def print_termination_report(self, report: TerminationReport) -> None:
+        console.print()
+        for result in report.attempted:
+            if result.status == EndStatus.ENDED:
+                forced = f", {len(result.forced)} force-killed" if result.forced else ""
+                console.print(f"[green]✓ Successfully ended process {result.process} ({result.program}{forced})[/green]")
+            else:
+                console.print(f"[red]✗ Could not end process {result.process} ({result.program}: {result.status.value})[/red]")
+
+        if not report.attempted:
+            console.print("[yellow]! No viable options were selected or no running programs were found.[/yellow]")
+        else:
+            console.print(f"[cyan] > Ended {len(report.attempted)} process(es) in {report.elapsed:.2f}s[/cyan]")
+
     def end_programs(self) -> None:
+        from rich.prompt import Prompt
         while True:
             self.list_programs()
             console.print()
@@ -199,36 +1948,18 @@ class ProgramManager:
                 console.print()
                 return
 
-            choices = [int(c.strip()) for c in choices.split(",") if c.strip().isdigit()]
-            
-            option = 1
-            action_taken = False
-            results = []
-            for category, programs in self.programs.items():
-                for name, program in programs.items():
-                    if option in choices:
-                        try:
-                            if program.is_running():
-                                logging.debug(f"> Ending program: {name}")
-                                program.end()
-                                action_taken = True
-                                results.append((name, True, ""))
-                        except Exception as e:
-                            logging.error(f"Error ending program {name}: {str(e)}")
-                            results.append((name, False, str(e)))
-                    option += 1
+            choices = sorted({int(c.strip()) for c in choices.split(",") if c.strip().isdigit()})
+            selected = []
+            for option in choices:
+                if option in self.program_options:
+                    _, name, program = self.program_options[option]
+                    logging.debug(f"> Ending program: {name}")
+                    selected.append(program)
 
-            console.print()
-            for name, success, reason in results:
-                if success:
-                    console.print(f"[green]✓ Successfully ended process {name}[/green]")
-                else:
-                    console.print(f"[red]✗ Could not end process {name} ({reason})[/red]")
-
-            if not action_taken:
-                console.print("[yellow]! No viable options were selected or no running programs were found.[/yellow]")
+            self.end_selected(selected)
         
     def end_categories(self) -> None:
+        from rich.prompt import Prompt
         while True:
             self.list_categories()
             console.print()
@@ -238,88 +1969,309 @@ class ProgramManager:
                 console.print()
                 return
 
-            choices = [int(c.strip()) for c in choices.split(",") if c.strip().isdigit()]
-            
-            option = 1
-            action_taken = False
-            results = []
-            for category, programs in self.programs.items():
-                if option in choices:
+            choices = sorted({int(c.strip()) for c in choices.split(",") if c.strip().isdigit()})
+            selected = []
+            for option in choices:
+                if option in self.category_options:
+                    category = self.category_options[option]
                     logging.debug(f"> Ending category: {category}")
-                    for name, program in programs.items():
-                        try:
-                            if program.is_running():
-                                program.end()
-                                action_taken = True
-                                results.append((name, True, ""))
-                        except Exception as e:
-                            logging.error(f"Error ending program {name} in category {category}: {str(e)}")
-                            results.append((name, False, str(e)))
-                option += 1
+                    selected.extend(self.programs[category].values())
 
+            self.end_selected(selected)
+            
+    def select_programs(self, names: Iterable[str] = (), categories: Iterable[str] = ()) -> List[Tuple[str, str, Program]]:
+        # Names are matched case-insensitively; unknown names raise KeyError so scripts fail loudly
+        wanted_names = {name.lower(): name for name in names}
+        wanted_categories = {category.lower(): category for category in categories}
+        known_categories = {category.lower() for category in self.programs}
+        missing = [category for key, category in wanted_categories.items() if key not in known_categories]
+        selected, found_names = [], set()
+        for category, programs in self.programs.items():
+            for name, program in programs.items():
+                if category.lower() in wanted_categories or name.lower() in wanted_names:
+                    selected.append((category, name, program))
+                    found_names.add(name.lower())
+        missing += [name for key, name in wanted_names.items() if key not in found_names]
+        if missing:
+            raise KeyError(", ".join(missing))
+        return selected
+
+    def load_profiles(self) -> Dict[str, KillProfile]:
+        try:
+            with open(self.profiles_file, "r", encoding="utf-8") as f:
+                profiles = json.load(f)
+        except FileNotFoundError:
+            return {}
+        return {name: KillProfile(name, details.get("categories", []), details.get("programs", [])) for name, details in profiles.items()}
+
+    def save_profile(self, name: str, categories: List[str] = (), programs: List[str] = ()) -> KillProfile:
+        # Validated up front, so a typo fails now instead of the next time the profile runs
+        self.select_programs(programs, categories)
+        profiles = self.load_profiles()
+        profiles[name] = KillProfile(name, list(categories), list(programs))
+        write_json_atomic(self.profiles_file, {profile.name: profile.to_json() for profile in profiles.values()}, indent=2)
+        self.plans.pop(name, None)
+        logging.info(f"Saved profile {name} to {self.profiles_file}")
+        return profiles[name]
+
+    def delete_profile(self, name: str) -> None:
+        profiles = self.load_profiles()
+        if name not in profiles:
+            raise KeyError(name)
+        del profiles[name]
+        write_json_atomic(self.profiles_file, {profile.name: profile.to_json() for profile in profiles.values()}, indent=2)
+        self.plans.pop(name, None)
+
+    def compile_profile(self, name: str) -> KillPlan:
+        plan = self.plans.get(name)
+        if plan is None:
+            profiles = self.load_profiles()
+            if name not in profiles:
+                raise KeyError(name)
+            profile = profiles[name]
+            plan = self.plans[name] = KillPlan(profile, self.select_programs(profile.programs, profile.categories))
+        return plan
+
+    def preview_plan(self, plan: KillPlan, snapshot: ProcessSnapshot) -> dict:
+        targets = self.terminator.targets(plan.matcher, snapshot)
+        names = {process.pid: process.name for process in snapshot.processes}
+        return {
+            "profile": plan.profile.name,
+            "dry_run": True,
+            "targets": [{"program": program.name, "process": label, "pids": pids, "images": sorted({names[pid] for pid in pids})}
+                        for program, label, pids in targets if pids],
+            "pids": len({pid for _, _, pids in targets for pid in pids}),
+            "estimated_seconds": round(self.terminator.estimate(targets), 3),
+        }
+
+    def print_preview(self, preview: dict) -> None:
+        from rich.table import Table
+        table = Table(title=f"Dry run: {preview['profile']}")
+        table.add_column("Program", style="magenta")
+        table.add_column("Rule", style="blue")
+        table.add_column("Processes", style="yellow")
+        table.add_column("PIDs", style="cyan")
+        for target in preview["targets"]:
+            table.add_row(target["program"], target["process"], ", ".join(target["images"]), ", ".join(map(str, target["pids"])))
+        console.print(table)
+        console.print(f"[cyan] > Would end {preview['pids']} process(es), estimated {preview['estimated_seconds']:.2f}s[/cyan]")
+        console.print()
+
+    def run_profile(self, name: str, dry_run: bool = False) -> Tuple[KillPlan, Optional[Union[dict, TerminationReport]]]:
+        plan = self.compile_profile(name)
+        snapshot = self.current_snapshot(tree=True)
+        if snapshot is None:
+            console.print()
+            console.print("[red]✗ Could not read the process table[/red]")
+            return plan, None
+        if dry_run:
+            preview = self.preview_plan(plan, snapshot)
+            self.print_preview(preview)
+            return plan, preview
+        metrics.count("programs.touched", len(plan.programs))
+        report = self.terminator.end(plan.programs, snapshot, plan.matcher)
+        self.process_table.invalidate()
+        self.print_termination_report(report)
+        logging.info(f"Ran profile {name}: {len(report.attempted)} processes in {report.elapsed:.3f}s")
+        return plan, report
+
+    def run_profile_prompt(self) -> None:
+        from rich.prompt import Confirm, Prompt
+        from rich.table import Table
+        while True:
+            profiles = list(self.load_profiles().values())
+            table = Table(title="Profiles")
+            table.add_column("Option", style="cyan", no_wrap=True)
+            table.add_column("Profile", style="yellow")
+            table.add_column("Categories", style="magenta")
+            table.add_column("Programs", style="blue")
+            for option, profile in enumerate(profiles, start=1):
+                table.add_row(str(option), profile.name, ", ".join(profile.categories), ", ".join(profile.programs))
+            table.add_row("0", "Back to Main Menu", "", "")
+            console.print(table)
+            if not profiles:
+                console.print("[yellow]! No profiles yet. Create one with: python program_manager.py profile save NAME --category ... --program ...[/yellow]")
+            console.print()
+            choice = Prompt.ask("[cyan]? Enter a profile number to run or 0 to return[/cyan]")
+            if not choice.strip().isdigit() or not 1 <= int(choice) <= len(profiles):
+                console.print()
+                return
+            name = profiles[int(choice) - 1].name
+            try:
+                _, preview = self.run_profile(name, dry_run=True)
+            except KeyError as e:
+                console.print(f"[red]! Profile {name} refers to an unknown program or category: {e.args[0]}[/red]")
+                continue
+            if preview is not None and preview["targets"] and Confirm.ask("[cyan]? End these processes?[/cyan]"):
+                self.run_profile(name)
+
+    def plan_free_memory(self, snapshot: ProcessSnapshot, top: int = None, target: int = None) -> List[Tuple[str, str, Program, ResourceUsage]]:
+        # Biggest consumers first: the top N of them, or as many as it takes to reach the target
+        usage, _ = self.resource_usage(snapshot)
+        candidates = sorted(((category, name, program, usage[program]) for category, programs in self.programs.items()
+                             for name, program in programs.items() if program in usage and usage[program].memory > 0),
+                            key=lambda candidate: -candidate[3].memory)
+        if top is not None:
+            return candidates[:top]
+        plan, planned = [], 0
+        for candidate in candidates:
+            if target is not None and planned >= target:
+                break
+            plan.append(candidate)
+            planned += candidate[3].memory
+        return plan
+
+    def free_memory(self, top: int = None, target: int = None) -> Optional[dict]:
+        snapshot = self.current_snapshot(tree=True)
+        if snapshot is None:
             console.print()
-            for name, success, reason in results:
-                if success:
-                    console.print(f"[green]✓ Successfully ended process {name}[/green]")
+            console.print("[red]✗ Could not read the process table[/red]")
+            return None
+        plan = self.plan_free_memory(snapshot, top, target)
+        programs = [program for _, _, program, _ in plan]
+        before = {(process.pid, process.name.lower()): process.memory or 0
+                  for processes in self.program_processes(programs, snapshot).values() for process in processes}
+        available_before = available_memory()
+
+        report = self.end_selected(programs) if programs else None
+        # Measured, not estimated: whatever the targeted processes still hold afterwards was not reclaimed
+        try:
+            after = self.process_table.refresh().keys()
+        except Exception as e:
+            logging.error(f"Error capturing process snapshot: {str(e)}")
+            after = {}
+        # A survivor counts with what it holds now; one whose memory can't be read is assumed unchanged
+        still_used = sum(memory if after[key].memory is None else after[key].memory for key, memory in before.items() if key in after)
+        reclaimed = sum(before.values()) - still_used
+        available_after = available_memory()
+
+        logging.info(f"Freed {format_size(reclaimed)} by ending {len(programs)} programs")
+        console.print(f"[cyan] > Reclaimed {format_size(reclaimed)} from {len(programs)} program(s)[/cyan]")
+        if available_before is not None and available_after is not None:
+            console.print(f"[cyan] > Available memory: {format_size(available_before)} -> {format_size(available_after)}[/cyan]")
+        console.print()
+        return {
+            "programs": [{"category": category, "program": name, "memory": program_usage.memory} for category, name, _, program_usage in plan],
+            "planned": sum(program_usage.memory for _, _, _, program_usage in plan),
+            "reclaimed": reclaimed,
+            "available_before": available_before,
+            "available_after": available_after,
+            "failed": len(report.failed) if report else 0,
+        }
+
+    def show_dashboard(self) -> None:
+        try:
+            Dashboard(self, self.dashboard_interval).run()
+        except KeyboardInterrupt:
+            logging.info("Dashboard closed by user")
+        console.print()
+
+    def free_memory_prompt(self) -> None:
+        from rich.prompt import Prompt
+        while True:
+            self.list_programs_by("memory")
+            choice = Prompt.ask("[cyan]? Enter how many of the biggest programs to end (e.g. 3), an amount to free (e.g. 2G) or 0 to return[/cyan]")
+            if choice.strip() == "0":
+                console.print()
+                return
+            try:
+                if choice.strip().isdigit():
+                    self.free_memory(top=int(choice))
                 else:
-                    console.print(f"[red]✗ Could not end process {name} ({reason})[/red]")
+                    self.free_memory(target=parse_size(choice))
+            except ValueError:
+                console.print("[red]! Enter a number of programs or a size like 512M or 2G[/red]")
+
+    def list_programs_by(self, sort_by: str) -> None:
+        previous, self.sort_by = self.sort_by, sort_by
+        try:
+            self.list_programs()
+        finally:
+            self.sort_by = previous
+
+    def end_online_presence_programs(self) -> Tuple[List[Tuple[str, str, Program]], Optional[TerminationReport]]:
+        # Categories are matched case-insensitively like everywhere else; missing ones are skipped, not an error
+        known = {category.lower() for category in self.programs}
+        selected = self.select_programs(categories=[category for category in self.online_presence_categories if category.lower() in known])
+        snapshot = self.current_snapshot(tree=True)
+        report = self.terminator.end([program for _, _, program in selected], snapshot) if snapshot is not None else None
+        self.process_table.invalidate()
+        return selected, report
 
-            if not action_taken:
-                console.print("[yellow]! No viable options were selected or no running programs were found.[/yellow]")
-            
     def end_online_presence(self) -> None:
+        from rich.table import Table
         table = Table(title="Online Presence Programs")
         table.add_column("Category", style="yellow")
         table.add_column("Program", style="magenta")
         table.add_column("Processes", style="blue")
         table.add_column("Status", style="bold")
 
+        selected, report = self.end_online_presence_programs()
+        program_statuses: Dict[str, set] = {}
+        for result in report.results if report else []:
+            program_statuses.setdefault(result.program, set()).add(result.status)
+
         action_taken = False
-        for category in self.online_presence_categories:
-            if category in self.programs:
-                for name, program in self.programs[category].items():
-                    try:
-                        is_running = program.is_running()
-                        status = "[green]Running[/green]" if is_running else "[red]Offline[/red]"
-                        if is_running:
-                            program.end()
-                            action_taken = True
-                            status = "[yellow]Ended[/yellow]"
-                    except Exception as e:
-                        logging.error(f"Error ending program {name}: {str(e)}")
-                        status = "[red]Error[/red]"
-                    
-                    table.add_row(
-                        category,
-                        name,
-                        ", ".join(program.processes),
-                        status
-                    )
+        for category, name, program in selected:
+            statuses = program_statuses.get(name, set())
+            if report is None:
+                status = "[yellow]Unknown[/yellow]"
+            elif statuses - {EndStatus.ENDED, EndStatus.NOT_RUNNING}:
+                status = "[red]Error[/red]"
+            elif EndStatus.ENDED in statuses:
+                action_taken = True
+                status = "[yellow]Ended[/yellow]"
+            else:
+                status = "[red]Offline[/red]"
+
+            table.add_row(
+                category,
+                name,
+                program.process_labels,
+                status
+            )
 
         console.print(table)
+        if report is not None:
+            console.print(f"[cyan] > Took {report.elapsed:.2f}s[/cyan]")
         
         if not action_taken:
             console.print("[yellow]! No running online presence programs were found.[/yellow]")
         else:
             console.print("[green]> Online presence programs have been ended.[/green]")
 
-    def scan_programs(self) -> None:
+    def merge_previous_scan(self, template: Dict[str, Dict[str, dict]], user_programs: Dict[str, Dict[str, dict]]) -> None:
+        # Programs the cancelled scan did not reach keep their entry from the last complete scan
+        try:
+            with open(self.user_config_file, "r", encoding="utf-8") as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            return
+        for category, programs in previous.items():
+            for program, details in programs.items():
+                if program in template.get(category, {}):
+                    user_programs[category].setdefault(program, details)
+
+    def scan_programs(self) -> Optional[dict]:
         console.print()
         console.print("[cyan] > Scanning for programs...[/cyan]")
         logging.info("Starting program scan")
         
         # Load program paths
         try:
-            with open("data/programs_default_paths.json", "r") as f:
-                paths = json.load(f)["paths"]
-            logging.debug(f"Loaded {len(paths)} paths from data/programs_default_paths.json")
+            with open(self.paths_file, "r") as f:
+                scan_config = json.load(f)
+            paths = scan_config["paths"]
+            skip_patterns = scan_config.get("skip", [])
+            max_depth = scan_config.get("max_depth")
+            logging.debug(f"Loaded {len(paths)} paths from {self.paths_file}")
         except FileNotFoundError:
-            logging.error("data/programs_default_paths.json not found")
-            console.print("[red]! Error: data/programs_default_paths.json not found[/red]")
+            logging.error(f"{self.paths_file} not found")
+            console.print(f"[red]! Error: {self.paths_file} not found[/red]")
             return
         except json.JSONDecodeError:
-            logging.error("Error decoding data/programs_default_paths.json")
-            console.print("[red]! Error: data/programs_default_paths.json is not a valid JSON file[/red]")
+            logging.error(f"Error decoding {self.paths_file}")
+            console.print(f"[red]! Error: {self.paths_file} is not a valid JSON file[/red]")
             return
 
         # Replace %USERNAME% with actual username
@@ -345,49 +2297,117 @@ class ProgramManager:
 
         # Initialize user programs
         user_programs = {category: {} for category in template}
+        try:
+            scanner = ProgramScanner(template, skip_patterns, max_depth, self.scan_workers)
+        except re.error as e:
+            logging.error(f"Error in {self.template_file}: {str(e)}")
+            console.print(f"[red]! Error: {self.template_file} has an invalid pattern: {str(e)}[/red]")
+            return
+        cache_file = os.path.join(os.path.dirname(self.user_config_file), f"scan_cache_{self.user}.json")
+        cache_key = scanner.cache_key(template)
+        scanner.cache = ScanCache(cache_key) if self.full_rescan else ScanCache.load(cache_file, cache_key)
+        version_cache_file = os.path.join(os.path.dirname(self.user_config_file), f"version_cache_{self.user}.json")
+        if self.scan_metadata:
+            scanner.version_cache = VersionInfoCache() if self.full_rescan else VersionInfoCache.load(version_cache_file)
+
+        scan_id = None
+        if self.catalog is not None:
+            self.catalog.import_template(template)
+            scan_id = self.catalog.begin_scan(self.user)
 
         # Scan for programs
         programs_found = 0
-        for path in paths:
-            logging.debug(f"Scanning directory: {path}")
-            for file in glob.glob(os.path.join(path, "**", "*.exe"), recursive=True):
-                filename = os.path.basename(file)
-                logging.debug(f"Found executable: {file}")
-                for category, programs in template.items():
-                    for program, details in programs.items():
-                        if filename in details["processes"]:
-                            user_programs[category][program] = {
-                                "processes": details["processes"],
-                                "path": file
-                            }
-                            logging.info(f"Matched program: {program} ({file})")
-                            programs_found += 1
+        cancelled = False
+        scores: Dict[Tuple[str, str], int] = {}
+        events = scanner.iter_scan(paths)
+        try:
+            from rich.progress import Progress, SpinnerColumn, TextColumn, TimeElapsedColumn
+            with Progress(SpinnerColumn(), TextColumn("{task.description}"), TimeElapsedColumn(), console=console.get(), transient=True) as progress:
+                task = progress.add_task("Scanning", total=None)
+                for event in events:
+                    if isinstance(event, ScanProgress):
+                        progress.update(task, description=f"{event.root} | {event.directories} directories | "
+                                                          f"{event.files_per_second:.0f} files/s | {programs_found} matches")
+                        continue
+                    category, program, file, version_info, score = event
+                    if score < scores.get((category, program), score):
+                        logging.info(f"Skipping {file} for {program}, an earlier match has better version info")
+                        continue
+                    scores[(category, program)] = score
+                    user_programs[category][program] = dict(template[category][program], path=file)
+                    if version_info is not None:
+                        user_programs[category][program]["version_info"] = version_info
+                    if scan_id is not None:
+                        self.catalog.record_match(scan_id, self.user, category, program, file, version_info)
+                    logging.info(f"Matched program: {program} ({file})")
+                    programs_found += 1
+        except KeyboardInterrupt:
+            cancelled = True
+            logging.info("Scan cancelled by user, saving partial results")
+            console.print("[yellow]! Scan cancelled, saving partial results[/yellow]")
+        finally:
+            events.close()
 
         # Save user programs
+        if self.catalog is not None:
+            saved_to = self.catalog.path
+            with metrics.timer("config.save"):
+                self.catalog.finish_scan(scan_id, self.user, programs_found, cancelled)
+                user_programs = self.catalog.export_json(self.user)
+            logging.info(f"Saved {programs_found} programs to {saved_to}")
+        else:
+            saved_to = self.user_config_file
+            if cancelled:
+                self.merge_previous_scan(template, user_programs)
+            try:
+                with metrics.timer("config.save"):
+                    write_json_atomic(self.user_config_file, user_programs, indent=2)
+                logging.info(f"Saved {programs_found} programs to {self.user_config_file}")
+            except IOError:
+                logging.error(f"Error writing to {self.user_config_file}")
+                console.print(f"[red]! Error: Unable to write to {self.user_config_file}[/red]")
+                return
+
         try:
-            with open(self.user_config_file, "w") as f:
-                json.dump(user_programs, f, indent=2)
-            logging.info(f"Saved {programs_found} programs to {self.user_config_file}")
-        except IOError:
-            logging.error(f"Error writing to {self.user_config_file}")
-            console.print(f"[red]! Error: Unable to write to {self.user_config_file}[/red]")
-            return
+            scanner.cache.save(cache_file, partial=cancelled)
+            logging.info(f"Scan cache: {scanner.cache.hits} directories reused, {scanner.cache.misses} rescanned")
+        except OSError as e:
+            logging.error(f"Error writing scan cache {cache_file}: {str(e)}")
+        if scanner.version_cache is not None:
+            try:
+                scanner.version_cache.save(version_cache_file, partial=cancelled)
+                logging.info(f"Version info cache: {scanner.version_cache.hits} files reused, {scanner.version_cache.misses} read")
+            except OSError as e:
+                logging.error(f"Error writing version info cache {version_cache_file}: {str(e)}")
 
-        console.print(f"[green] > Scan complete. {programs_found} programs found and saved to {self.user_config_file}[/green]")
+        if cancelled:
+            console.print(f"[yellow] > Scan cancelled. {programs_found} programs found so far and saved to {saved_to}[/yellow]")
+        else:
+            console.print(f"[green] > Scan complete. {programs_found} programs found and saved to {saved_to}[/green]")
         console.print()
-        self.load_config()  # Reload the config to include new programs
+        self.set_programs(user_programs)  # The scan result is already in memory, no need to re-read it
         logging.info("Program scan completed")
+        return {"programs_found": programs_found, "cancelled": cancelled, "saved_to": saved_to}
 
-    def run(self) -> None:
-        console.print()
-        console.print(pyfiglet.figlet_format("Program Manager™", font="slant"))
+    def run(self, banner: bool = True) -> None:
+        from rich.prompt import Prompt
+        if banner:
+            import pyfiglet
+            console.print()
+            console.print(pyfiglet.figlet_format("Program Manager™", font="slant"))
         logging.info("Program Manager started")
         try:
+            first_prompt = True
             while True:
                 self.display_menu()
                 console.print()
-                choice = Prompt.ask("[cyan] ? Choose an option[/cyan]", choices=["1", "2", "3", "4", "5", "0"])
+                if first_prompt:
+                    logging.info(f"Time to first prompt: {(time.perf_counter() - STARTED_AT) * 1000:.0f} ms")
+                    first_prompt = False
+                choice = Prompt.ask("[cyan] ? Choose an option[/cyan]", choices=["1", "2", "3", "4", "5", "6", "7", "8", "9", "0"])
                 logging.debug(f"User chose option: {choice}")
+                touched = metrics.counters.get("programs.touched", 0)
+                action_started = time.perf_counter()
 
                 if choice == "1":
                     self.end_programs()
@@ -399,37 +2419,829 @@ class ProgramManager:
                     self.scan_programs()
                 elif choice == "5":
                     self.display_help()
+                elif choice == "6":
+                    self.free_memory_prompt()
+                elif choice == "7":
+                    self.run_profile_prompt()
+                elif choice == "8":
+                    self.show_dashboard()
+                elif choice == "9":
+                    self.end_online_presence()
                 elif choice == "0":
                     break
+                metrics.record_action(self.MENU_ACTIONS[choice], metrics.counters.get("programs.touched", 0) - touched,
+                                      time.perf_counter() - action_started)
 
         except KeyboardInterrupt:
             logging.info("Exiting program due to user interrupt")
         finally:
-            console.print()
-            console.print(pyfiglet.figlet_format("See you soon!", font="slant"))
+            if banner:
+                console.print()
+                console.print(pyfiglet.figlet_format("See you soon!", font="slant"))
             logging.info("Program Manager finished")
 
-def setup_logging(debug: bool) -> None:
+class WatchPolicy(NamedTuple):
+    action: str
+    delay: float = 0.0
+
+    @classmethod
+    def parse(cls, text: str) -> "WatchPolicy":
+        # "kill", "log" or "kill-after:<seconds>"
+        action, _, delay = text.strip().lower().partition(":")
+        if action in ("kill", "log") and not delay:
+            return cls(action)
+        if action == "kill-after" and delay:
+            return cls(action, float(delay))
+        raise ValueError(f"invalid watch policy: {text}")
+
+class WatchEvent(NamedTuple):
+    kind: str
+    category: str
+    program: str
+    process: str
+    pid: int
+    detail: str = ""
+
+    def to_json(self) -> dict:
+        return {"time": time.strftime("%Y-%m-%d %H:%M:%S"), **self._asdict()}
+
+class ProcessWatcher:
+    def __init__(self, manager: "ProgramManager", policies: Dict[str, WatchPolicy], interval: float = 2.0,
+                 respawn_limit: int = 3, respawn_window: float = 60.0, backoff: float = 300.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.manager = manager
+        self.interval = interval
+        self.respawn_limit = respawn_limit
+        self.respawn_window = respawn_window
+        self.backoff = backoff
+        self.clock = clock
+        self.stop_event = threading.Event()
+
+        # Policies name categories case-insensitively, like every other category argument
+        categories = {category.lower(): category for category in manager.programs}
+        policies = {categories.get(category.lower(), category): policy for category, policy in policies.items()}
+        # One compiled matcher for every watched program, so each new process costs one lookup
+        self.matcher = ProcessMatcher(((category, name, policy), program.processes)
+                                      for category, policy in policies.items()
+                                      for name, program in manager.programs.get(category, {}).items())
+        self.watched: Dict[int, Tuple[str, str, WatchPolicy]] = {}
+
+        self.snapshot: Optional[ProcessSnapshot] = None
+        self.pending: Dict[int, Tuple[float, ProcessInfo]] = {}
+        self.kill_history: Dict[str, List[float]] = {}
+        self.suppressed_until: Dict[str, float] = {}
+
+    def poll(self) -> List[WatchEvent]:
+        snapshot = ProcessSnapshot.capture(self.manager.process_table.backend, self.matcher.needs_details)
+        started, exited = snapshot.diff(self.snapshot)
+        self.snapshot = snapshot
+        now = self.clock()
+        events = []
+        to_kill: List[ProcessInfo] = []
+
+        for process in exited:
+            rule = self.watched.pop(process.pid, None)
+            if rule is not None:
+                self.pending.pop(process.pid, None)
+                events.append(WatchEvent("exited", rule[0], rule[1], process.name, process.pid))
+
+        for process in started:
+            rule = self.rule_for(process)
+            if rule is None:
+                continue
+            self.watched[process.pid] = rule
+            category, name, policy = rule
+            if policy.action == "log":
+                events.append(WatchEvent("started", category, name, process.name, process.pid))
+            elif policy.action == "kill":
+                to_kill.append(process)
+            else:
+                events.append(WatchEvent("started", category, name, process.name, process.pid, f"ending in {policy.delay:g}s"))
+                self.pending[process.pid] = (now + policy.delay, process)
+
+        for pid, (due, process) in list(self.pending.items()):
+            if due <= now:
+                del self.pending[pid]
+                to_kill.append(process)
+
+        events.extend(self.kill(to_kill, now))
+        return events
+
+    def rule_for(self, process: ProcessInfo) -> Optional[Tuple[str, str, WatchPolicy]]:
+        for index in self.matcher.rules_for_name(process.name):
+            rule = self.matcher.rules[index]
+            if rule.accepts(process):
+                return rule.owner
+        return None
+
+    def kill(self, processes: List[ProcessInfo], now: float) -> List[WatchEvent]:
+        # One decision per image and poll: a program running several processes at once is one kill pass, not several respawns
+        events, allowed = [], []
+        decisions: Dict[str, bool] = {}
+        for process in processes:
+            category, name, _ = self.watched[process.pid]
+            image = process.name.lower()
+            if image not in decisions:
+                decisions[image] = self.should_kill(image, now)
+            if decisions[image]:
+                allowed.append(process)
+            else:
+                # Retried once the backoff is over, so survivors don't outlive it
+                self.pending[process.pid] = (self.suppressed_until[image], process)
+                events.append(WatchEvent("suppressed", category, name, process.name, process.pid,
+                                         f"respawned {self.respawn_limit} times within {self.respawn_window:g}s"))
+        if not allowed:
+            return events
+
+        statuses = self.manager.terminator.kill_pids(sorted(process.pid for process in allowed))
+        for process in allowed:
+            category, name, _ = self.watched[process.pid]
+            status = statuses[process.pid]
+            kind = "killed" if status in (EndStatus.ENDED, EndStatus.NOT_RUNNING) else "kill_failed"
+            events.append(WatchEvent(kind, category, name, process.name, process.pid, status.value))
+        return events
+
+    def should_kill(self, image: str, now: float) -> bool:
+        # Something keeps restarting this image; stop fighting it for a while instead of spinning on kills
+        if self.suppressed_until.get(image, 0) > now:
+            return False
+        history = [killed_at for killed_at in self.kill_history.get(image, []) if now - killed_at < self.respawn_window]
+        if len(history) >= self.respawn_limit:
+            self.suppressed_until[image] = now + self.backoff
+            self.kill_history[image] = []
+            logging.warning(f"{image} keeps respawning, not ending it for {self.backoff:g}s")
+            return False
+        history.append(now)
+        self.kill_history[image] = history
+        return True
+
+    def run(self, on_event: Callable[[WatchEvent], None] = None, duration: float = None) -> None:
+        logging.info(f"Watching {len(self.matcher.rules)} process rules every {self.interval:g}s")
+        deadline = None if duration is None else self.clock() + duration
+        while not self.stop_event.is_set():
+            try:
+                events = self.poll()
+            except Exception as e:
+                logging.error(f"Error polling the process table: {str(e)}")
+                events = []
+            for event in events:
+                logging.info(f"Watch: {event.kind} {event.process} ({event.program}, PID {event.pid}) {event.detail}".rstrip())
+                if on_event is not None:
+                    on_event(event)
+            if deadline is not None and self.clock() >= deadline:
+                break
+            # Sleeping on the event keeps idle CPU near zero and lets stop() wake the loop immediately
+            self.stop_event.wait(self.interval)
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+class Dashboard:
+    # Always-on status view: rows are cached cells, and the table is only rebuilt and redrawn when a poll changed something
+    def __init__(self, manager: ProgramManager, interval: float = 1.0):
+        self.manager = manager
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.board = manager.status_board
+        self.cells: Dict[Program, Tuple[str, str]] = {}
+        self.table = None
+        self.rendered_version = -1
+        self.updated_at: Optional[str] = None
+
+    def poll(self) -> set:
+        self.manager.process_table.details = self.manager.matcher.needs_details
+        snapshot = self.manager.process_table.refresh()
+        changed = self.board.update(snapshot)
+        for program in changed:
+            pids = self.board.pids.get(program, [])
+            self.cells[program] = ("[green]Running[/green]" if pids else "[red]Offline[/red]", str(len(pids)) if pids else "")
+        if changed:
+            self.updated_at = time.strftime("%H:%M:%S")
+        return changed
+
+    def render(self):
+        if self.table is not None and self.rendered_version == self.board.version:
+            return self.table
+        from rich.table import Table
+        running = len(self.board.pids)
+        table = Table(title=f"Programs (every {self.interval:g}s, Ctrl+C to stop)",
+                      caption=f"{running} running, last change {self.updated_at or '-'}")
+        table.add_column("Option", style="cyan", no_wrap=True)
+        table.add_column("Category", style="yellow")
+        table.add_column("Program", style="magenta")
+        table.add_column("PIDs", justify="right")
+        table.add_column("Status", style="bold")
+        previous_category = None
+        for option, (category, name, program) in self.manager.program_options.items():
+            if previous_category is not None and category != previous_category:
+                table.add_section()
+            status, pids = self.cells.get(program, ("[yellow]Unknown[/yellow]", ""))
+            table.add_row(str(option), category if category != previous_category else "", name, pids, status)
+            previous_category = category
+        self.table = table
+        self.rendered_version = self.board.version
+        return table
+
+    def run(self, duration: float = None) -> None:
+        from rich.live import Live
+        try:
+            self.poll()
+        except Exception as e:
+            logging.error(f"Error polling the process table: {str(e)}")
+        deadline = None if duration is None else time.monotonic() + duration
+        with Live(self.render(), console=console.get(), auto_refresh=False) as live:
+            while not self.stop_event.wait(self.interval):
+                try:
+                    changed = self.poll()
+                except Exception as e:
+                    logging.error(f"Error polling the process table: {str(e)}")
+                    changed = set()
+                if changed:
+                    live.update(self.render(), refresh=True)
+                    logging.debug(f"Dashboard updated {len(changed)} rows")
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+class FleetAgent:
+    # Newline-delimited JSON over TCP. Requests are {"id", "token", "argv"}, where argv is one of this script's subcommands
+    # (or "snapshot" for the raw process table); replies are {"id", "exit_code", "result"} or {"id", "error"}.
+    REMOTE_COMMANDS = {"status", "end", "scan", "online-presence", "free-memory", "profile", "snapshot"}
+    MAX_LINE = 16 * 1024 * 1024
+
+    def __init__(self, manager: ProgramManager, host: str = "127.0.0.1", port: int = DEFAULT_AGENT_PORT, token: str = None):
+        self.manager = manager
+        self.host = host
+        self.port = port
+        self.token = token
+        # ProgramManager is not thread-safe, so commands from different connections run one at a time
+        self.lock = threading.Lock()
+        self.server = None
+
+    async def start(self):
+        import asyncio
+        self.server = await asyncio.start_server(self.handle, self.host, self.port, limit=self.MAX_LINE)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logging.info(f"Agent listening on {self.host}:{self.port}")
+        return self.server
+
+    async def serve_forever(self) -> None:
+        server = await self.start()
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader, writer) -> None:
+        import asyncio
+        peer = writer.get_extra_info("peername")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await asyncio.to_thread(self.dispatch, line)
+                writer.write(json.dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            logging.warning(f"Agent connection from {peer} dropped: {str(e)}")
+        finally:
+            writer.close()
+
+    def dispatch(self, line: bytes) -> dict:
+        import hmac
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {"id": None, "error": "invalid JSON"}
+        if not isinstance(request, dict):
+            return {"id": None, "error": "expected a JSON object"}
+        request_id = request.get("id")
+        if self.token is not None and not hmac.compare_digest(str(request.get("token") or ""), self.token):
+            logging.warning("Agent rejected a request with an invalid token")
+            return {"id": request_id, "error": "invalid token"}
+        argv = request.get("argv")
+        if not isinstance(argv, list) or not argv or argv[0] not in self.REMOTE_COMMANDS:
+            return {"id": request_id, "error": f"unsupported command, expected one of {sorted(self.REMOTE_COMMANDS)}"}
+
+        # A failing command must still be answered, otherwise the controller only sees a dropped connection
+        try:
+            with self.lock:
+                logging.info(f"Agent running: {' '.join(map(str, argv))}")
+                return self.execute(request_id, argv)
+        except Exception as e:
+            logging.exception(f"Agent command failed: {' '.join(map(str, argv))}")
+            return {"id": request_id, "error": f"{type(e).__name__}: {str(e)}"}
+
+    def execute(self, request_id, argv: list) -> dict:
+        if argv[0] == "snapshot":
+            snapshot = self.manager.process_table.refresh()
+            return {"id": request_id, "exit_code": 0, "result": {"command": "snapshot", "processes": [process._asdict() for process in snapshot.processes]}}
+        import contextlib
+        import io
+        errors = io.StringIO()
+        try:
+            with contextlib.redirect_stderr(errors):
+                args = build_parser().parse_args([str(arg) for arg in argv])
+        except SystemExit:
+            return {"id": request_id, "error": errors.getvalue().strip().splitlines()[-1] if errors.getvalue().strip() else "invalid arguments"}
+        exit_code, payload = execute_command(self.manager, args)
+        return {"id": request_id, "exit_code": exit_code, "result": payload}
+
+class FleetHost(NamedTuple):
+    host: str
+    port: int = DEFAULT_AGENT_PORT
+
+    @classmethod
+    def parse(cls, text: str, default_port: int = DEFAULT_AGENT_PORT) -> "FleetHost":
+        host, separator, port = text.rpartition(":")
+        if separator and port.isdigit():
+            return cls(host.strip("[]"), int(port))
+        return cls(text, default_port)
+
+    def __str__(self) -> str:
+        return f"{self.host}:{self.port}"
+
+class ConnectionPool:
+    # Idle connections are reused by later requests to the same agent; at most max_per_host are open to one agent
+    def __init__(self, max_per_host: int = 2, limit: int = FleetAgent.MAX_LINE):
+        self.max_per_host = max_per_host
+        self.limit = limit
+        self.idle: Dict[FleetHost, list] = {}
+        self.slots: Dict[FleetHost, object] = {}
+        self.opened = 0
+
+    async def acquire(self, host: FleetHost):
+        import asyncio
+        slots = self.slots.setdefault(host, asyncio.Semaphore(self.max_per_host))
+        await slots.acquire()
+        try:
+            idle = self.idle.setdefault(host, [])
+            while idle:
+                reader, writer = idle.pop()
+                if not writer.is_closing() and not reader.at_eof():
+                    return reader, writer
+            connection = await asyncio.open_connection(host.host, host.port, limit=self.limit)
+            self.opened += 1
+            return connection
+        except BaseException:
+            slots.release()
+            raise
+
+    def release(self, host: FleetHost, connection, reuse: bool) -> None:
+        if reuse:
+            self.idle.setdefault(host, []).append(connection)
+        else:
+            connection[1].close()
+        self.slots[host].release()
+
+    async def close(self) -> None:
+        for connections in self.idle.values():
+            for _, writer in connections:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except (ConnectionError, OSError):
+                    pass
+        self.idle.clear()
+
+class FleetController:
+    def __init__(self, hosts: List[FleetHost], token: str = None, timeout: float = 5.0, max_concurrency: int = 32, max_per_host: int = 2):
+        self.hosts = hosts
+        self.token = token
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.pool = ConnectionPool(max_per_host)
+        self.next_id = 0
+
+    async def request(self, host: FleetHost, argv: List[str]) -> dict:
+        # Every host gets its own deadline, so one hung agent can't hold up the rest of the fleet
+        import asyncio
+        start = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(self._request(host, argv), self.timeout)
+        except asyncio.TimeoutError:
+            response = {"error": f"timed out after {self.timeout:g}s"}
+        except (OSError, ValueError) as e:
+            response = {"error": str(e) or type(e).__name__}
+        response["elapsed"] = round(time.perf_counter() - start, 4)
+        if "error" in response:
+            logging.error(f"Fleet request to {host} failed: {response['error']}")
+        return response
+
+    async def _request(self, host: FleetHost, argv: List[str]) -> dict:
+        reader, writer = await self.pool.acquire(host)
+        reuse = False
+        try:
+            self.next_id += 1
+            writer.write(json.dumps({"id": self.next_id, "token": self.token, "argv": argv}).encode("utf-8") + b"\n")
+            await writer.drain()
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("agent closed the connection")
+            response = json.loads(line)
+            reuse = True
+            return response
+        finally:
+            self.pool.release(host, (reader, writer), reuse)
+
+    async def run(self, argv: List[str]) -> Dict[str, dict]:
+        import asyncio
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def limited(host: FleetHost) -> dict:
+            async with semaphore:
+                return await self.request(host, argv)
+
+        responses = await asyncio.gather(*(limited(host) for host in self.hosts))
+        return {str(host): response for host, response in zip(self.hosts, responses)}
+
+    async def running_hosts(self, program: str) -> List[str]:
+        responses = await self.run(["status", "--program", program, "--running"])
+        return summarize_fleet(["status"], responses)["running"].get(program, [])
+
+    async def close(self) -> None:
+        await self.pool.close()
+
+def summarize_fleet(argv: List[str], responses: Dict[str, dict]) -> dict:
+    summary = {
+        "hosts": len(responses),
+        "unreachable": [host for host, response in responses.items() if "exit_code" not in response],
+        "failed": [host for host, response in responses.items() if response.get("exit_code")],
+    }
+    if argv[0] == "status":
+        running: Dict[str, List[str]] = {}
+        for host, response in responses.items():
+            for entry in response.get("result", {}).get("programs", []):
+                if entry["running"]:
+                    running.setdefault(entry["program"], []).append(host)
+        summary["running"] = running
+    elif argv[0] == "free-memory":
+        answered = {host: response.get("result", {}) for host, response in responses.items() if "exit_code" in response}
+        summary["reclaimed"] = {host: result.get("reclaimed", 0) for host, result in answered.items()}
+        summary["reclaimed_total"] = sum(summary["reclaimed"].values())
+        summary["programs"] = {host: [entry["program"] for entry in result.get("programs", [])] for host, result in answered.items()}
+    elif argv[0] in ("end", "online-presence", "profile"):
+        summary["ended"] = {host: sum(1 for result in response.get("result", {}).get("results", []) if result["status"] == EndStatus.ENDED.value)
+                            for host, response in responses.items() if "exit_code" in response}
+    return summary
+
+def setup_logging(debug: bool, queued: bool = False) -> None:
     level = logging.DEBUG if debug else logging.INFO
-    logging.basicConfig(
-        level=level,
-        format="%(asctime)s - %(levelname)s - %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-        filename="data/program_manager.log",
-        filemode="a"
-    )
+    if not queued:
+        logging.basicConfig(
+            level=level,
+            format="%(asctime)s - %(levelname)s - %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S",
+            filename="data/program_manager.log",
+            filemode="a"
+        )
+        return
 
-if __name__ == "__main__":
+    # Callers only enqueue records; a background thread does the file appends
+    file_handler = logging.FileHandler("data/program_manager.log", mode="a", encoding="utf-8")
+    file_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s", datefmt="%Y-%m-%d %H:%M:%S"))
+    log_queue = queue.Queue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # The file handler does the real formatting, the queue only needs the bare message
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.basicConfig(level=level, handlers=[queue_handler])
+    listener.start()
+    atexit.register(listener.stop)
+
+def report_metrics(args: argparse.Namespace) -> None:
+    if args.profile_json:
+        with open(args.profile_json, "w", encoding="utf-8") as f:
+            json.dump(metrics.summary(), f, indent=2)
+    elif args.command:
+        # stdout carries the command's JSON, so the profile goes to stderr
+        print(json.dumps(metrics.summary(), indent=2), file=sys.stderr)
+    else:
+        metrics.print_summary()
+
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Program Manager")
     parser.add_argument("--debug", action="store_true", help="Enable debug mode")
-    args = parser.parse_args()
+    parser.add_argument("--concurrent-probes", action="store_true", help="Check program status with parallel per-program probes")
+    parser.add_argument("--probe-workers", type=int, default=8, help="Maximum number of concurrent status probes")
+    parser.add_argument("--probe-timeout", type=float, default=5.0, help="Seconds before a status probe is shown as Unknown")
+    parser.add_argument("--scan-workers", type=int, default=8, help="Number of directories scanned in parallel")
+    parser.add_argument("--full-rescan", action="store_true", help="Ignore the scan cache and walk every directory again")
+    parser.add_argument("--scan-metadata", action="store_true",
+                        help="Read product, company and version from matched executables to pick the right file and save it with the path")
+    parser.add_argument("--graceful", action="store_true", help="End whole process trees: ask them to close first, force-kill survivors at the deadline")
+    parser.add_argument("--close-timeout", type=float, default=5.0, help="Seconds a program gets to close before it is force-killed (--graceful)")
+    parser.add_argument("--dashboard-interval", type=float, default=1.0, help="Seconds between live dashboard refreshes")
+    parser.add_argument("--sort", choices=ProgramManager.SORT_KEYS, default="name", help="Order of the program tables")
+    parser.add_argument("--no-banner", action="store_true", help="Skip the start and exit banners")
+    parser.add_argument("--profile", action="store_true", help="Collect timings and spawn counts and print a summary on exit")
+    parser.add_argument("--profile-json", metavar="FILE", help="Write the profile summary as JSON to FILE (implies --profile)")
+    parser.add_argument("--queue-logging", action="store_true", help="Write the log file from a background thread")
+    parser.add_argument("--catalog", metavar="FILE", help=f"Keep programs and scan results in a SQLite catalog, e.g. {DEFAULT_CATALOG_FILE}")
+
+    # Subcommands skip the menu and print JSON; without one the interactive menu starts
+    subparsers = parser.add_subparsers(dest="command")
+    status_parser = subparsers.add_parser("status", help="Print the status of programs as JSON")
+    end_parser = subparsers.add_parser("end", help="End programs and print the results as JSON")
+    for subparser in (status_parser, end_parser):
+        subparser.add_argument("--program", action="append", default=[], help="Program name (repeatable)")
+        subparser.add_argument("--category", action="append", default=[], help="Category name (repeatable)")
+    status_parser.add_argument("--running", action="store_true", help="Only list running programs")
+    end_parser.add_argument("--dry-run", action="store_true", help="Only print what would be ended and the estimated time")
+    subparsers.add_parser("scan", help="Scan for installed programs and print a summary as JSON")
+    presence_parser = subparsers.add_parser("online-presence", help="End all online presence programs and print the results as JSON")
+    presence_parser.add_argument("--category", action="append", default=[], help="Override the online presence categories (repeatable)")
+    watch_parser = subparsers.add_parser("watch", help="Keep enforcing per-category policies and print events as JSON lines")
+    watch_parser.add_argument("--policy", action="append", default=[], metavar="CATEGORY=ACTION",
+                              help="ACTION is kill, log or kill-after:<seconds> (repeatable, default: kill the online presence categories)")
+    watch_parser.add_argument("--interval", type=float, default=2.0, help="Seconds between process table polls")
+    watch_parser.add_argument("--respawn-limit", type=int, default=3, help="Kills within --respawn-window before an image is left alone")
+    watch_parser.add_argument("--respawn-window", type=float, default=60.0, help="Seconds over which respawns are counted")
+    watch_parser.add_argument("--backoff", type=float, default=300.0, help="Seconds a respawning image is left alone")
+    watch_parser.add_argument("--duration", type=float, help="Stop after this many seconds")
+    free_parser = subparsers.add_parser("free-memory", help="End the programs using the most memory and print what was reclaimed as JSON")
+    amount = free_parser.add_mutually_exclusive_group(required=True)
+    amount.add_argument("--top", type=int, help="End this many of the biggest programs")
+    amount.add_argument("--target", type=parse_size, help="End programs until this much memory is freed, e.g. 2G")
+    dashboard_parser = subparsers.add_parser("dashboard", help="Show a live, auto-refreshing status table until Ctrl+C")
+    dashboard_parser.add_argument("--duration", type=float, help="Stop after this many seconds")
+    profile_parser = subparsers.add_parser("profile", help="Save, list, delete or run named sets of categories and programs")
+    profile_parser.add_argument("action", choices=["list", "save", "delete", "run"])
+    profile_parser.add_argument("name", nargs="?", help="Profile name")
+    profile_parser.add_argument("--program", action="append", default=[], help="Program name for save (repeatable)")
+    profile_parser.add_argument("--category", action="append", default=[], help="Category name for save (repeatable)")
+    profile_parser.add_argument("--dry-run", action="store_true", help="Only print what run would end and the estimated time")
+    agent_parser = subparsers.add_parser("agent", help="Serve status, end, scan and snapshot requests from a fleet controller over TCP")
+    agent_parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    agent_parser.add_argument("--port", type=int, default=DEFAULT_AGENT_PORT, help="Port to listen on")
+    agent_parser.add_argument("--token", help="Shared secret required from controllers (default: $PROGRAM_MANAGER_TOKEN)")
+    fleet_parser = subparsers.add_parser("fleet", help="Run a subcommand on many agents at once and print the aggregated results as JSON")
+    fleet_parser.add_argument("--host", action="append", required=True, help="Agent as HOST or HOST:PORT (repeatable)")
+    fleet_parser.add_argument("--port", type=int, default=DEFAULT_AGENT_PORT, help="Port for hosts given without one")
+    fleet_parser.add_argument("--token", help="Shared secret of the agents (default: $PROGRAM_MANAGER_TOKEN)")
+    fleet_parser.add_argument("--timeout", type=float, default=10.0, help="Seconds per host before it is reported as timed out")
+    fleet_parser.add_argument("--concurrency", type=int, default=32, help="Maximum number of hosts contacted at once")
+    fleet_parser.add_argument("remote", nargs=argparse.REMAINDER, help="Subcommand to run on every agent, e.g. status --program Steam")
+    catalog_parser = subparsers.add_parser("catalog", help="Import, export or query the SQLite catalog and print JSON")
+    catalog_parser.add_argument("action", choices=["import", "export", "lookup", "discovered"],
+                                help="import: load programs.json and this user's programs_db JSON; export: write the JSON format; "
+                                     "lookup: programs owning IMAGE; discovered: paths found for all users")
+    catalog_parser.add_argument("image", nargs="?", help="Process image for lookup")
+    catalog_parser.add_argument("--user", help="Export the scan results of this user instead of the template")
+    catalog_parser.add_argument("--program", help="Only list paths discovered for this program")
+    catalog_parser.add_argument("--output", help="Write the export to this file instead of stdout")
+    return parser
+
+def run_catalog(manager: ProgramManager, args: argparse.Namespace) -> int:
+    catalog = manager.catalog
+    payload = {"command": "catalog", "action": args.action, "catalog": catalog.path}
+    if args.action == "import":
+        manager.sync_catalog_template()
+        payload["programs"] = sum(len(programs) for programs in catalog.export_json().values())
+        payload["paths"] = manager.import_user_config() if os.path.exists(manager.user_config_file) else 0
+    elif args.action == "export":
+        config = catalog.export_json(args.user)
+        if not args.output:
+            print(json.dumps(config, indent=2))
+            return 0
+        write_json_atomic(args.output, config, indent=2)
+        payload["saved_to"] = args.output
+    elif args.action == "lookup":
+        if not args.image:
+            payload["error"] = "lookup needs an IMAGE"
+            print(json.dumps(payload, indent=2))
+            return 2
+        payload["image"] = args.image
+        payload["programs"] = [{"category": category, "program": program} for category, program in catalog.lookup_image(args.image)]
+    elif args.action == "discovered":
+        payload["paths"] = [{"user": user, "category": category, "program": program, "path": path}
+                            for user, category, program, path in catalog.discovered(args.program)]
+    print(json.dumps(payload, indent=2))
+    return 0
+
+def run_watch(manager: ProgramManager, args: argparse.Namespace) -> int:
+    try:
+        policies = {}
+        for entry in args.policy:
+            category, separator, action = entry.rpartition("=")
+            if not separator:
+                raise ValueError(f"invalid watch policy: {entry}")
+            policies[category] = WatchPolicy.parse(action)
+        if not policies:
+            policies = {category: WatchPolicy("kill") for category in manager.online_presence_categories if category in manager.programs}
+        manager.select_programs(categories=policies)
+    except (KeyError, ValueError) as e:
+        print(json.dumps({"command": "watch", "error": str(e.args[0])}, indent=2))
+        return 2
+
+    watcher = ProcessWatcher(manager, policies, args.interval, args.respawn_limit, args.respawn_window, args.backoff)
+    try:
+        watcher.run(lambda event: print(json.dumps(event.to_json()), flush=True), duration=args.duration)
+    except KeyboardInterrupt:
+        logging.info("Watch stopped by user")
+    return 0
+
+def run_profile_command(manager: ProgramManager, args: argparse.Namespace, payload: dict) -> int:
+    if args.action == "list":
+        payload["profiles"] = {name: profile.to_json() for name, profile in manager.load_profiles().items()}
+        return 0
+    if not args.name:
+        payload["error"] = f"profile {args.action} needs a NAME"
+        return 2
+    payload["profile"] = args.name
+    if args.action == "save":
+        if not args.program and not args.category:
+            raise KeyError("no --program or --category given")
+        payload.update(manager.save_profile(args.name, args.category, args.program).to_json())
+        payload["images"] = manager.compile_profile(args.name).images
+        return 0
+    if args.action == "delete":
+        manager.delete_profile(args.name)
+        return 0
+    console.get().quiet = True
+    _, outcome = manager.run_profile(args.name, dry_run=args.dry_run)
+    if outcome is None:
+        payload["error"] = "could not read the process table"
+        return 1
+    if args.dry_run:
+        payload.update(outcome)
+        return 0
+    payload.update(outcome.to_json())
+    return 1 if outcome.failed else 0
+
+def run_agent(manager: ProgramManager, args: argparse.Namespace) -> int:
+    import asyncio
+    token = args.token or os.environ.get("PROGRAM_MANAGER_TOKEN")
+    if token is None and args.host not in ("127.0.0.1", "localhost", "::1"):
+        # Anyone who can reach the port could end processes, so a reachable agent needs a shared secret
+        print(json.dumps({"command": "agent", "error": "listening on a non-loopback address needs --token or PROGRAM_MANAGER_TOKEN"}, indent=2))
+        return 2
+    console.get().quiet = True
+    agent = FleetAgent(manager, args.host, args.port, token)
+    try:
+        asyncio.run(agent.serve_forever())
+    except KeyboardInterrupt:
+        logging.info("Agent stopped by user")
+    return 0
+
+def run_fleet(manager: ProgramManager, args: argparse.Namespace) -> int:
+    import asyncio
+    remote = args.remote[1:] if args.remote[:1] == ["--"] else args.remote
+    payload = {"command": "fleet", "argv": remote}
+    try:
+        # Validated against the local catalog first, so a typo fails here instead of on every host
+        if not remote or remote[0] not in FleetAgent.REMOTE_COMMANDS:
+            raise ValueError(f"expected one of {sorted(FleetAgent.REMOTE_COMMANDS)}")
+        if remote[0] != "snapshot":
+            remote_args = build_parser().parse_args(remote)
+            if getattr(remote_args, "program", None) or (getattr(remote_args, "category", None) and remote[0] != "profile"):
+                manager.select_programs(remote_args.program or [], remote_args.category or [])
+    except (KeyError, ValueError) as e:
+        payload["error"] = f"unknown program or category: {e.args[0]}" if isinstance(e, KeyError) else str(e)
+        print(json.dumps(payload, indent=2))
+        return 2
+
+    controller = FleetController([FleetHost.parse(host, args.port) for host in args.host],
+                                 args.token or os.environ.get("PROGRAM_MANAGER_TOKEN"), args.timeout, args.concurrency)
+
+    async def fan_out() -> Dict[str, dict]:
+        try:
+            return await controller.run(remote)
+        finally:
+            await controller.close()
+
+    start = time.perf_counter()
+    payload["hosts"] = asyncio.run(fan_out())
+    payload["summary"] = summarize_fleet(remote, payload["hosts"])
+    payload["elapsed"] = round(time.perf_counter() - start, 4)
+    print(json.dumps(payload, indent=2))
+    return 1 if payload["summary"]["unreachable"] or payload["summary"]["failed"] else 0
+
+def run_command(manager: ProgramManager, args: argparse.Namespace) -> int:
+    # Exit codes: 0 success, 1 something could not be checked or ended, 2 unknown program or category
+    if args.command == "watch":
+        return run_watch(manager, args)
+    if args.command == "catalog":
+        return run_catalog(manager, args)
+    if args.command == "dashboard":
+        # The one subcommand that draws for a human instead of printing JSON
+        try:
+            Dashboard(manager, manager.dashboard_interval).run(duration=args.duration)
+        except KeyboardInterrupt:
+            logging.info("Dashboard closed by user")
+        return 0
+    if args.command == "agent":
+        return run_agent(manager, args)
+    if args.command == "fleet":
+        return run_fleet(manager, args)
+
+    exit_code, payload = execute_command(manager, args)
+    print(json.dumps(payload, indent=2))
+    return exit_code
+
+def execute_command(manager: ProgramManager, args: argparse.Namespace) -> Tuple[int, dict]:
+    start = time.perf_counter()
+    touched = metrics.counters.get("programs.touched", 0)
+    payload = {"command": args.command}
+    exit_code = 0
+    try:
+        if args.command == "status":
+            if args.program or args.category:
+                selected = manager.select_programs(args.program, args.category)
+            else:
+                selected = manager.select_programs(categories=manager.programs)
+            running = manager.probe_running([program for _, _, program in selected])
+            usage, _ = manager.resource_usage()
+            payload["programs"] = [
+                {"category": category, "program": name, "processes": program.processes, "path": program.path, "running": is_running,
+                 "memory": usage[program].memory if program in usage else None,
+                 "cpu_time": usage[program].cpu_time if program in usage else None}
+                for (category, name, program), is_running in zip(selected, running)
+                if is_running or not args.running
+            ]
+            if manager.sort_by != "name":
+                payload["programs"].sort(key=lambda entry: manager.sort_key(usage.get(manager.programs[entry["category"]][entry["program"]])))
+            exit_code = 1 if None in running else 0
+        elif args.command == "end":
+            if not args.program and not args.category:
+                raise KeyError("no --program or --category given")
+            selected = manager.select_programs(args.program, args.category)
+            snapshot = manager.current_snapshot(tree=True)
+            if snapshot is not None and args.dry_run:
+                payload.update(manager.preview_plan(KillPlan(KillProfile("end", args.category, args.program), selected), snapshot))
+                payload.pop("profile")
+            elif snapshot is None:
+                payload["error"] = "could not read the process table"
+                exit_code = 1
+            else:
+                metrics.count("programs.touched", len(selected))
+                report = manager.terminator.end([program for _, _, program in selected], snapshot)
+                manager.process_table.invalidate()
+                payload.update(report.to_json())
+                exit_code = 1 if report.failed else 0
+        elif args.command == "online-presence":
+            if args.category:
+                manager.online_presence_categories = args.category
+                manager.select_programs(categories=args.category)
+            _, report = manager.end_online_presence_programs()
+            if report is None:
+                payload["error"] = "could not read the process table"
+                exit_code = 1
+            else:
+                payload.update(report.to_json())
+                exit_code = 1 if report.failed else 0
+        elif args.command == "profile":
+            exit_code = run_profile_command(manager, args, payload)
+        elif args.command == "free-memory":
+            console.get().quiet = True
+            result = manager.free_memory(top=args.top, target=args.target)
+            if result is None:
+                payload["error"] = "could not read the process table"
+                exit_code = 1
+            else:
+                payload.update(result)
+                exit_code = 1 if result["failed"] else 0
+        elif args.command == "scan":
+            console.get().quiet = True
+            summary = manager.scan_programs()
+            if summary is None:
+                payload["error"] = "scan failed, see data/program_manager.log"
+                exit_code = 1
+            else:
+                payload.update(summary)
+    except KeyError as e:
+        payload["error"] = f"unknown program or category: {e.args[0]}"
+        exit_code = 2
+
+    metrics.record_action(args.command, metrics.counters.get("programs.touched", 0) - touched, time.perf_counter() - start)
+    payload.setdefault("elapsed", round(time.perf_counter() - start, 4))
+    return exit_code, payload
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+
+    setup_logging(args.debug, queued=args.queue_logging)
+    metrics.enabled = args.profile or bool(args.profile_json)
+    options = dict(concurrent_probes=args.concurrent_probes, probe_workers=args.probe_workers, probe_timeout=args.probe_timeout,
+                   scan_workers=args.scan_workers, full_rescan=args.full_rescan,
+                   catalog_file=args.catalog or (DEFAULT_CATALOG_FILE if args.command == "catalog" else None),
+                   graceful=args.graceful, close_timeout=args.close_timeout, sort_by=args.sort,
+                   dashboard_interval=args.dashboard_interval, scan_metadata=args.scan_metadata)
 
-    setup_logging(args.debug)
+    if args.command:
+        # Scripted runs never relaunch elevated, that would detach them from stdout; run them from an elevated shell instead
+        exit_code = run_command(ProgramManager(**options), args)
+        if metrics.enabled:
+            report_metrics(args)
+        sys.exit(exit_code)
 
     if run_as_admin():
         logging.debug("Starting Program Manager with admin privileges")
-        manager = ProgramManager()
-        manager.run()
+        manager = ProgramManager(**options)
+        manager.run(banner=not args.no_banner)
+        if metrics.enabled:
+            report_metrics(args)
         logging.debug("Program Manager finished")
     else:
-        logging.info("Restarting with admin privileges...")
\ No newline at end of file
+        logging.info("Restarting with admin privileges...")
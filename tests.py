@@ -1,8 +1,23 @@
 import unittest
 from unittest.mock import patch, MagicMock
+import contextlib
+import io
 import json
 import os
-from program_manager import Program, ProgramManager
+import re
+import shutil
+import tempfile
+import time
+import program_manager
+from program_manager import Program, ProgramManager, build_parser, run_command, walk_executables, ProgramScanner, ScanCache, ScanMatch, ScanProgress, ProcessInfo, ProcessSnapshot, ProcessTable, ProcessMatcher, FakeProcessBackend, TasklistBackend, ProcfsBackend, ProcessTerminator, EndResult, EndStatus, StatusProber, ProcessWatcher, WatchPolicy, Metrics, ProgramCatalog, Dashboard, StatusBoard, ResourceUsage, format_size, parse_size, read_version_info, VersionInfoCache, FleetAgent, FleetController, FleetHost
+
+def setUpModule():
+    # Managers compile their config on construction; keep that cache out of the repository's data folder
+    cache_dir = tempfile.mkdtemp()
+    patcher = patch.object(ProgramManager, "CONFIG_CACHE_FILE", os.path.join(cache_dir, "config_cache_{user}.bin"))
+    patcher.start()
+    unittest.addModuleCleanup(patcher.stop)
+    unittest.addModuleCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
 
 class TestProgramManager(unittest.TestCase):
     @patch('builtins.open', new_callable=unittest.mock.mock_open, read_data='{"category": {"program": {"processes": ["notepad.exe"]}}}')
@@ -56,18 +71,1024 @@ class TestProgramManager(unittest.TestCase):
         manager.scan_programs()
         mock_print.assert_called()
 
-class TestProgram(unittest.TestCase):
+    @patch('rich.console.Console.print')
+    def test_list_programs_uses_one_snapshot(self, mock_print):
+        backend = FakeProcessBackend([ProcessInfo("chrome.exe", 100)])
+        manager = ProgramManager(process_backend=backend)
+        manager.list_programs()
+        manager.list_categories()
+        self.assertEqual(backend.calls, 1)
+
+class TestCompiledConfig(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.template = os.path.join(self.root, "programs.json")
+        with open(self.template, "w") as f:
+            json.dump({"category": {"program": {"processes": ["notepad.exe"]}}}, f)
+
+    def make_manager(self):
+        manager = ProgramManager.__new__(ProgramManager)
+        manager.template_file = self.template
+        manager.user_config_file = os.path.join(self.root, "missing.json")
+        manager.config_cache_file = os.path.join(self.root, "config_cache.bin")
+        manager.catalog = None
+        return manager
+
+    def test_cache_is_reused_until_source_changes(self):
+        manager = self.make_manager()
+        manager.load_config()
+        self.assertTrue(os.path.exists(manager.config_cache_file))
+        with patch('json.load', side_effect=AssertionError("parsed JSON again")):
+            manager.load_config()
+        self.assertEqual(manager.programs["category"]["program"].processes, ["notepad.exe"])
+
+        with open(self.template, "w") as f:
+            json.dump({"category": {"program": {"processes": ["notepad.exe", "notepad2.exe"]}}}, f)
+        manager.load_config()
+        self.assertEqual(manager.programs["category"]["program"].processes, ["notepad.exe", "notepad2.exe"])
+
+    @patch('logging.error')
+    def test_invalid_pattern_is_reported(self, mock_error):
+        with open(self.template, "w") as f:
+            json.dump({"category": {"program": {"processes": ["re:program(.exe"]}}}, f)
+        manager = self.make_manager()
+        with self.assertRaises(SystemExit):
+            manager.load_config()
+        self.assertIn("program: invalid pattern 're:program(.exe'", mock_error.call_args[0][0])
+
+    def test_corrupt_cache_falls_back_to_json(self):
+        manager = self.make_manager()
+        with open(manager.config_cache_file, "wb") as f:
+            f.write(b"not a cache")
+        manager.load_config()
+        self.assertIn("program", manager.programs["category"])
+
+class TestProcessSnapshot(unittest.TestCase):
     @patch('subprocess.run')
-    def test_is_running(self, mock_run):
-        mock_run.return_value.stdout = "notepad.exe"
-        program = Program(name="TestProgram", processes=["notepad.exe"])
-        self.assertTrue(program.is_running())
+    def test_tasklist_backend(self, mock_run):
+        mock_run.return_value.stdout = '"Notepad.exe","1234","Console","1","10,000 K"\n"chrome.exe","42","Console","1","5,000 K"\n'
+        processes = TasklistBackend().list_processes()
+        mock_run.assert_called_once()
+        self.assertEqual(processes, [ProcessInfo("Notepad.exe", 1234, memory=10_240_000), ProcessInfo("chrome.exe", 42, memory=5_120_000)])
+
+    def test_case_insensitive_index(self):
+        snapshot = ProcessSnapshot([ProcessInfo("Notepad.exe", 1), ProcessInfo("notepad.exe", 2)])
+        self.assertEqual(snapshot.pids("NOTEPAD.EXE"), [1, 2])
+        self.assertFalse(snapshot.is_running("chrome.exe"))
+
+    def test_ttl(self):
+        backend = FakeProcessBackend()
+        table = ProcessTable(backend, ttl=60)
+        self.assertIs(table.snapshot(), table.snapshot())
+        table.invalidate()
+        table.snapshot()
+        self.assertEqual(backend.calls, 2)
+
+class SlowProcessBackend(FakeProcessBackend):
+    def query_images(self, images, timeout):
+        if "hung.exe" in images:
+            time.sleep(0.5)
+        return super().query_images(images, timeout)
+
+class SlowListingBackend(FakeProcessBackend):
+    # Single-image queries answer at once, only the full listing is slow
+    def list_processes(self, details=False):
+        time.sleep(1.0)
+        return super().list_processes(details)
+
+    def query_images(self, images, timeout):
+        running = {process.name.lower() for process in self.processes}
+        return any(image.lower() in running for image in images)
+
+class TestStatusProber(unittest.TestCase):
+    def test_timed_out_probe_is_unknown(self):
+        backend = SlowProcessBackend([ProcessInfo("chrome.exe", 1)])
+        programs = [Program("Chrome", ["chrome.exe"]), Program("Hung", ["hung.exe"]), Program("Edge", ["msedge.exe"])]
+        start = time.monotonic()
+        statuses = StatusProber(backend, max_workers=3, timeout=0.1).probe(programs)
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertEqual(statuses, [True, None, False])
+
+    def test_hung_probe_does_not_hold_back_the_queue(self):
+        backend = SlowProcessBackend([ProcessInfo("chrome.exe", 1)])
+        programs = [Program("Hung", ["hung.exe"]), Program("Chrome", ["chrome.exe"]), Program("Edge", ["msedge.exe"])]
+        start = time.monotonic()
+        statuses = StatusProber(backend, max_workers=1, timeout=0.1).probe(programs)
+        self.assertLess(time.monotonic() - start, 0.3)
+        self.assertEqual(statuses, [None, True, False])
+
+    @patch('rich.console.Console.print')
+    def test_list_programs_concurrent(self, mock_print):
+        manager = ProgramManager(process_backend=FakeProcessBackend([ProcessInfo("chrome.exe", 1)]), concurrent_probes=True)
+        self.assertEqual(manager.probe_statuses([Program("Chrome", ["chrome.exe"])]), ["[green]Running[/green]"])
+        manager.list_programs()
+        mock_print.assert_called()
+
+    @patch('rich.console.Console.print')
+    def test_slow_listing_keeps_the_probe_deadline(self, mock_print):
+        manager = ProgramManager(process_backend=SlowListingBackend([ProcessInfo("chrome.exe", 1)]), concurrent_probes=True, probe_timeout=0.2)
+        manager.set_programs({"Web Browsers": {"Chrome": {"processes": ["chrome.exe"]}, "Edge": {"processes": ["msedge.exe"]}}})
+        start = time.monotonic()
+        manager.list_programs()
+        self.assertLess(time.monotonic() - start, 0.8)
+        rendered = [str(cell) for call in mock_print.call_args_list for arg in call.args if hasattr(arg, "columns")
+                    for column in arg.columns if column.header == "Memory" for cell in column._cells]
+        self.assertIn("[yellow]Unknown[/yellow]", rendered)
+
+def build_pe(strings: dict, version=(1, 2, 3, 4), machine=0x8664) -> bytes:
+    # Minimal PE32+ image: headers, one .rsrc section and a VS_VERSIONINFO resource
+    import struct
+
+    def node(key, value=b"", children=(), text=False):
+        data = struct.pack("<HHH", 0, len(value) // 2 if text else len(value), int(text)) + (key + "\0").encode("utf-16-le")
+        data += b"\0" * (-len(data) % 4) + value
+        for child in children:
+            data += b"\0" * (-len(data) % 4) + child
+        return struct.pack("<H", len(data)) + data[2:]
+
+    fixed = struct.pack("<13I", 0xFEEF04BD, 0x10000, version[0] << 16 | version[1], version[2] << 16 | version[3],
+                        version[0] << 16 | version[1], version[2] << 16 | version[3], 0, 0, 4, 1, 0, 0, 0)
+    table = node("040904b0", children=[node(key, (value + "\0").encode("utf-16-le"), text=True) for key, value in strings.items()])
+    info = node("VS_VERSION_INFO", fixed, [node("StringFileInfo", children=[table])])
+    directory = lambda ident, target: struct.pack("<IIHHHH", 0, 0, 0, 0, 0, 1) + struct.pack("<II", ident, target)
+    resources = (directory(16, 0x80000018) + directory(1, 0x80000030) + directory(0x409, 0x48)
+                 + struct.pack("<IIII", 0x1058, len(info), 0, 0) + info)
+    optional = bytearray(240)
+    struct.pack_into("<H", optional, 0, 0x20B)
+    struct.pack_into("<I", optional, 108, 16)
+    struct.pack_into("<II", optional, 112 + 16, 0x1000, len(resources))
+    header = bytearray(64)
+    header[:2] = b"MZ"
+    struct.pack_into("<I", header, 0x3C, 64)
+    section = struct.pack("<8sIIII16x", b".rsrc", len(resources), 0x1000, len(resources), 0x200)
+    image = bytes(header) + b"PE\0\0" + struct.pack("<HHIIIHH", machine, 1, 0, 0, 0, 240, 0x22) + bytes(optional) + section
+    return image + b"\0" * (0x200 - len(image)) + resources
+
+class TestScan(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for relative in ["Steam/steam.exe", "Steam/bin/steamwebhelper.EXE", "Steam/readme.txt",
+                         "WindowsApps/zen.exe", "a/b/c/d/discord.exe"]:
+            path = os.path.join(self.root, *relative.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "w").close()
+        os.symlink(self.root, os.path.join(self.root, "Steam", "loop"))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_walk_executables(self):
+        found = {os.path.relpath(path, self.root) for path in walk_executables(self.root, ["windowsapps"], max_depth=2, follow_links=True)}
+        self.assertEqual(found, {os.path.join("Steam", "steam.exe"), os.path.join("Steam", "bin", "steamwebhelper.EXE")})
+
+    def test_scanner_matches_every_owner(self):
+        scanner = ProgramScanner({"Gaming": {"Steam": {"processes": ["Steam.exe"]}}, "Other": {"Updater": {"processes": ["steam.exe"]}}})
+        self.assertEqual(scanner.matcher.match_file(os.path.join(self.root, "Steam", "steam.exe")), [("Gaming", "Steam"), ("Other", "Updater")])
+
+    def test_parallel_scan_matches_sequential(self):
+        for i in range(20):
+            path = os.path.join(self.root, f"vendor{i}", "bin", "steam.exe")
+            os.makedirs(os.path.dirname(path))
+            open(path, "w").close()
+        template = {"Gaming Platforms": {"Steam": {"processes": ["steam.exe", "steamwebhelper.exe"]}}}
+        sequential = ProgramScanner(template, workers=1).scan([self.root, os.path.join(self.root, "a")])
+        parallel = ProgramScanner(template, workers=8).scan([self.root, os.path.join(self.root, "a")])
+        self.assertEqual(len(sequential), 22)
+        self.assertEqual(sequential, parallel)
+        self.assertEqual(sequential, ProgramScanner(template, workers=1).scan([self.root, os.path.join(self.root, "a")]))
+
+    def test_scan_lists_every_directory_once(self):
+        os.makedirs(os.path.join(self.root, "Tools"))
+        os.symlink(os.path.join(self.root, "Steam"), os.path.join(self.root, "Tools", "SteamLink"))
+        template = {"Gaming Platforms": {"Steam": {"processes": ["steam.exe", "steamwebhelper.exe"]}}}
+        listed = []
+        read_directory = program_manager.read_directory
+        def record(directory, *args):
+            listed.append(os.path.realpath(directory))
+            return read_directory(directory, *args)
+        with patch('program_manager.read_directory', side_effect=record):
+            matches = ProgramScanner(template, workers=4, follow_links=True).scan([self.root])
+        # The root is split into units and walked from the same listing, and Steam is reached through the link too
+        self.assertEqual(sorted(listed), sorted(set(listed)))
+        self.assertEqual(sorted(os.path.basename(match.path) for match in matches), ["steam.exe", "steamwebhelper.EXE"])
+
+    def test_scan_cache(self):
+        template = {"Gaming Platforms": {"Steam": {"processes": ["steam.exe", "steamwebhelper.exe"]}}}
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        cache_file = os.path.join(cache_dir, "cache.json")
+        scanner = ProgramScanner(template, workers=1)
+        key = scanner.cache_key(template)
+        scanner.cache = ScanCache(key)
+        cold = scanner.scan([self.root])
+        scanner.cache.save(cache_file)
+
+        scanner.cache = ScanCache.load(cache_file, key)
+        with patch('program_manager.read_directory', side_effect=AssertionError("directory listed again")):
+            self.assertEqual(scanner.scan([self.root]), cold)
+        self.assertEqual(scanner.cache.misses, 0)
+
+        open(os.path.join(self.root, "Steam", "bin", "steam.exe"), "w").close()
+        os.utime(os.path.join(self.root, "Steam", "bin"), ns=(0, 1))
+        scanner.cache = ScanCache.load(cache_file, key)
+        self.assertEqual(len(scanner.scan([self.root])), len(cold) + 1)
+        self.assertEqual(scanner.cache.misses, 1)
+
+        self.assertEqual(ScanCache.load(cache_file, "other template").previous, {})
+
+    def test_iter_scan_events(self):
+        template = {"Gaming Platforms": {"Steam": {"processes": ["steam.exe"]}}}
+        events = list(ProgramScanner(template, workers=2).iter_scan([self.root]))
+        self.assertEqual([event.path for event in events if isinstance(event, ScanMatch)], [os.path.join(self.root, "Steam", "steam.exe")])
+        progress = [event for event in events if isinstance(event, ScanProgress)]
+        self.assertEqual(progress[-1].root, self.root)
+        self.assertGreaterEqual(progress[-1].directories, 7)
+        self.assertEqual(progress[-1].matches, 1)
+
+    def write_pe(self, relative, **strings):
+        path = os.path.join(self.root, *relative.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(build_pe(strings))
+        return path
+
+    def test_read_version_info(self):
+        path = self.write_pe("Steam/steam.exe", ProductName="Steam", CompanyName="Valve Corporation", FileVersion="9.9")
+        self.assertEqual(read_version_info(path), {"machine": "x64", "file_version": "1.2.3.4", "product_version": "1.2.3.4",
+                                                   "product_name": "Steam", "company": "Valve Corporation"})
+        self.assertIsNone(read_version_info(os.path.join(self.root, "Steam", "steam.exe.missing")))
+        self.assertIsNone(read_version_info(os.path.join(self.root, "WindowsApps", "zen.exe")))
+        with open(path, "r+b") as f:
+            f.truncate(0x210)
+        self.assertIsNone(read_version_info(path))
+
+    def test_version_info_cache(self):
+        path = self.write_pe("Steam/steam.exe", ProductName="Steam")
+        cache_file = os.path.join(self.root, "versions.json")
+        cache = VersionInfoCache()
+        self.assertEqual(cache.read(path)["product_name"], "Steam")
+        cache.save(cache_file)
+        cache = VersionInfoCache.load(cache_file)
+        with patch('program_manager.read_version_info', side_effect=AssertionError("file read again")):
+            self.assertEqual(cache.read(path)["product_name"], "Steam")
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+        self.write_pe("Steam/steam.exe", ProductName="Steam Beta")
+        os.utime(path, ns=(0, 1))
+        self.assertEqual(cache.read(path)["product_name"], "Steam Beta")
+
+    @patch('rich.console.Console.print')
+    def test_scan_programs_version_info(self, mock_print):
+        # updater.exe is shipped by both launchers; the version resource decides which install it belongs to
+        self.write_pe("Valve/updater.exe", ProductName="Steam Client Updater", CompanyName="Valve Corporation")
+        self.write_pe("Epic/updater.exe", ProductName="Epic Online Services", CompanyName="Epic Games, Inc.")
+        self.write_pe("Fake/epicgameslauncher.exe", ProductName="Epic Games Launcher", CompanyName="Someone Else")
+        template = {"Gaming Platforms": {"Steam": {"processes": ["updater.exe"]},
+                                         "Epic Games Launcher": {"processes": ["updater.exe", "epicgameslauncher.exe"],
+                                                                 "version_match": {"company": "Epic Games*"}}}}
+        with open(os.path.join(self.root, "programs.json"), "w") as f:
+            json.dump(template, f)
+        with open(os.path.join(self.root, "paths.json"), "w") as f:
+            json.dump({"paths": [os.path.join(self.root, name) for name in ("Valve", "Epic", "Fake")]}, f)
+        manager = ProgramManager(config_file=os.path.join(self.root, "programs.json"), scan_metadata=True)
+        manager.paths_file = os.path.join(self.root, "paths.json")
+        manager.user_config_file = os.path.join(self.root, "programs_db.json")
+        manager.scan_programs()
+        with open(manager.user_config_file) as f:
+            saved = json.load(f)["Gaming Platforms"]
+        self.assertEqual(saved["Steam"]["path"], os.path.join(self.root, "Valve", "updater.exe"))
+        self.assertEqual(saved["Steam"]["version_info"]["company"], "Valve Corporation")
+        self.assertEqual(saved["Epic Games Launcher"]["path"], os.path.join(self.root, "Epic", "updater.exe"))
+        self.assertTrue(os.path.exists(os.path.join(self.root, f"version_cache_{manager.user}.json")))
+
+    @patch('rich.console.Console.print')
+    def test_scan_programs_cancelled(self, mock_print):
+        template = {"Gaming Platforms": {"Steam": {"processes": ["steam.exe"]}, "Epic": {"processes": ["epic.exe"]}}}
+        with open(os.path.join(self.root, "programs.json"), "w") as f:
+            json.dump(template, f)
+        with open(os.path.join(self.root, "paths.json"), "w") as f:
+            json.dump({"paths": [self.root]}, f)
+        manager = ProgramManager(config_file=os.path.join(self.root, "programs.json"))
+        manager.paths_file = os.path.join(self.root, "paths.json")
+        manager.user_config_file = os.path.join(self.root, "programs_db.json")
+        with open(manager.user_config_file, "w") as f:
+            json.dump({"Gaming Platforms": {"Epic": {"processes": ["epic.exe"], "path": "C:\\epic.exe"}}}, f)
+
+        def interrupted_scan(scanner, roots, progress_interval=0.1):
+            yield ScanMatch("Gaming Platforms", "Steam", "steam.exe")
+            raise KeyboardInterrupt
+
+        with patch.object(ProgramScanner, 'iter_scan', interrupted_scan):
+            manager.scan_programs()
+        with open(manager.user_config_file) as f:
+            saved = json.load(f)
+        self.assertEqual(saved["Gaming Platforms"]["Steam"]["path"], "steam.exe")
+        self.assertEqual(saved["Gaming Platforms"]["Epic"]["path"], "C:\\epic.exe")
+        self.assertFalse(os.path.exists(manager.user_config_file + ".tmp"))
+
+    @patch('rich.console.Console.print')
+    def test_scan_programs(self, mock_print):
+        template = {"Gaming Platforms": {"Steam": {"processes": ["steam.exe", "steamwebhelper.exe"]}},
+                    "Communication": {"Discord": {"processes": ["Discord.exe"]}}}
+        with open(os.path.join(self.root, "programs.json"), "w") as f:
+            json.dump(template, f)
+        with open(os.path.join(self.root, "paths.json"), "w") as f:
+            json.dump({"paths": [self.root], "skip": ["Steam"]}, f)
+        manager = ProgramManager(config_file=os.path.join(self.root, "programs.json"))
+        manager.paths_file = os.path.join(self.root, "paths.json")
+        manager.user_config_file = os.path.join(self.root, "programs_db.json")
+        manager.scan_programs()
+        with open(manager.user_config_file) as f:
+            saved = json.load(f)
+        self.assertEqual(saved, {"Gaming Platforms": {}, "Communication": {"Discord": {
+            "processes": ["Discord.exe"], "path": os.path.join(self.root, "a", "b", "c", "d", "discord.exe")}}})
+
+class TestResourceUsage(unittest.TestCase):
+    MB = 1024 * 1024
+
+    def setUp(self):
+        self.backend = FakeProcessBackend([
+            ProcessInfo("chrome.exe", 1, memory=500 * self.MB, cpu_time=30.0), ProcessInfo("chrome.exe", 2, memory=300 * self.MB, cpu_time=5.0),
+            ProcessInfo("steam.exe", 3, memory=200 * self.MB, cpu_time=60.0), ProcessInfo("discord.exe", 4, memory=100 * self.MB),
+            ProcessInfo("explorer.exe", 5, memory=900 * self.MB),
+        ], protected=[2])
+        self.manager = ProgramManager(process_backend=self.backend)
+        self.manager.set_programs({"Web Browsers": {"Chrome": {"processes": ["chrome.exe"]}},
+                                   "Gaming Platforms": {"Steam": {"processes": ["steam.exe"]}, "Epic": {"processes": ["epic.exe"]}},
+                                   "Communication": {"Discord": {"processes": ["discord.exe"]}}})
+
+    def test_sizes(self):
+        self.assertEqual(parse_size("2G"), 2 * 1024 ** 3)
+        self.assertEqual(parse_size("1.5mb"), int(1.5 * self.MB))
+        self.assertEqual(parse_size("4096"), 4096)
+        self.assertRaises(ValueError, parse_size, "lots")
+        self.assertEqual(format_size(1536 * self.MB), "1.5 GB")
+
+    def test_usage_per_program_and_category(self):
+        usage, categories = self.manager.resource_usage()
+        chrome = self.manager.programs["Web Browsers"]["Chrome"]
+        self.assertEqual(usage[chrome], ResourceUsage(800 * self.MB, 35.0, 2))
+        self.assertEqual(categories["Gaming Platforms"], ResourceUsage(200 * self.MB, 60.0, 1))
+        self.assertEqual(categories["Communication"].cpu_time, None)
+        self.manager.sort_by = "cpu"
+        ordered = sorted(usage, key=lambda program: self.manager.sort_key(usage[program]))
+        self.assertEqual([program.name for program in ordered], ["Steam", "Chrome", "Discord"])
+
+    @patch('rich.console.Console.print')
+    def test_list_views_reuse_the_status_board(self, mock_print):
+        self.manager.process_table.ttl = 0
+        self.manager.list_programs()
+        # A fresh snapshot with the same processes: nothing is compiled or matched again
+        with patch('program_manager.ProcessMatcher.__init__', side_effect=AssertionError("matcher rebuilt")), \
+                patch('program_manager.ProcessMatcher.owners', side_effect=AssertionError("snapshot re-matched")):
+            self.manager.list_programs()
+            self.manager.list_categories()
+        usage, _ = self.manager.resource_usage()
+        self.assertEqual(usage[self.manager.programs["Web Browsers"]["Chrome"]].memory, 800 * self.MB)
+
+    @patch('rich.console.Console.print')
+    def test_free_memory_until_target(self, mock_print):
+        result = self.manager.free_memory(target=850 * self.MB)
+        self.assertEqual([entry["program"] for entry in result["programs"]], ["Chrome", "Steam"])
+        self.assertEqual(result["planned"], 1000 * self.MB)
+        # PID 2 refused to die, so its memory was not reclaimed
+        self.assertEqual(result["reclaimed"], 700 * self.MB)
+        self.assertEqual(sorted(process.pid for process in self.backend.processes), [2, 4, 5])
+
+    @patch('rich.console.Console.print')
+    def test_free_memory_top(self, mock_print):
+        result = self.manager.free_memory(top=1)
+        self.assertEqual([entry["program"] for entry in result["programs"]], ["Chrome"])
+        self.assertEqual(result["failed"], 1)
+
+    def free_memory_with_survivor(self, memory):
+        # PID 2 survives the kill with the given memory
+        kill_pids = self.backend.kill_pids
+
+        def kill_and_resize(pids, timeout):
+            statuses = kill_pids(pids, timeout)
+            self.backend.processes = [process._replace(memory=memory) if process.pid == 2 else process for process in self.backend.processes]
+            return statuses
+
+        with patch.object(self.backend, "kill_pids", kill_and_resize):
+            return self.manager.free_memory(top=1)
+
+    @patch('rich.console.Console.print')
+    def test_free_memory_counts_what_a_survivor_gave_back(self, mock_print):
+        self.assertEqual(self.free_memory_with_survivor(100 * self.MB)["reclaimed"], 700 * self.MB)
+
+    @patch('rich.console.Console.print')
+    def test_free_memory_keeps_unreadable_survivors(self, mock_print):
+        self.assertEqual(self.free_memory_with_survivor(None)["reclaimed"], 500 * self.MB)
+
+class TestDashboard(unittest.TestCase):
+    def setUp(self):
+        self.backend = FakeProcessBackend([ProcessInfo("steam.exe", 10), ProcessInfo("Discord.exe", 11)])
+        self.manager = ProgramManager(process_backend=self.backend)
+
+    def test_board_only_rematches_changed_programs(self):
+        steam = self.manager.programs["Gaming Platforms"]["Steam"]
+        discord = self.manager.programs["Communication"]["Discord"]
+        board = StatusBoard([steam, discord])
+        self.assertEqual(board.update(ProcessSnapshot(self.backend.list_processes())), {steam, discord})
+        self.backend.processes = [ProcessInfo("Discord.exe", 11), ProcessInfo("discord.exe", 12), ProcessInfo("notepad.exe", 13)]
+        with patch.object(ProcessMatcher, 'owners', side_effect=AssertionError("full re-match")):
+            self.assertEqual(board.update(ProcessSnapshot(self.backend.list_processes())), {steam, discord})
+            self.assertEqual(board.pids, {discord: [11, 12]})
+            self.backend.processes.append(ProcessInfo("notepad.exe", 14))
+            self.assertEqual(board.update(ProcessSnapshot(self.backend.list_processes())), set())
+
+    def test_table_is_cached_until_something_changes(self):
+        dashboard = Dashboard(self.manager, interval=0.01)
+        dashboard.poll()
+        table = dashboard.render()
+        self.assertEqual(dashboard.poll(), set())
+        self.assertIs(dashboard.render(), table)
+        self.backend.processes = [ProcessInfo("Discord.exe", 11)]
+        self.assertEqual(dashboard.poll(), {self.manager.programs["Gaming Platforms"]["Steam"]})
+        self.assertIsNot(dashboard.render(), table)
+        self.assertEqual(dashboard.cells[self.manager.programs["Gaming Platforms"]["Steam"]], ("[red]Offline[/red]", ""))
+
+    def test_run_with_duration(self):
+        from rich.console import Console
+        output = io.StringIO()
+        with patch('program_manager.LazyConsole._console', Console(file=output, width=120)):
+            Dashboard(self.manager, interval=0.01).run(duration=0.05)
+        self.assertIn("Steam", output.getvalue())
+
+class TestKillProfiles(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.backend = FakeProcessBackend([ProcessInfo("steam.exe", 10), ProcessInfo("Discord.exe", 11), ProcessInfo("chrome.exe", 12)], latency=0.01)
+        self.manager = ProgramManager(process_backend=self.backend)
+        self.manager.profiles_file = os.path.join(self.root, "profiles.json")
+
+    def test_plan_is_deduplicated_and_cached(self):
+        self.manager.save_profile("pre-render", categories=["Gaming Platforms"], programs=["Steam", "discord"])
+        plan = self.manager.compile_profile("pre-render")
+        self.assertIs(self.manager.compile_profile("pre-render"), plan)
+        self.assertEqual([name for _, name, _ in plan.entries].count("Steam"), 1)
+        self.assertEqual(len(plan.images), len(set(image.lower() for image in plan.images)))
+        self.assertRaises(KeyError, self.manager.save_profile, "typo", programs=["Stean"])
+        self.assertRaises(KeyError, self.manager.compile_profile, "missing")
+
+    @patch('rich.console.Console.print')
+    def test_dry_run_then_run(self, mock_print):
+        self.manager.save_profile("focus", categories=["Communication"], programs=["Steam"])
+        _, preview = self.manager.run_profile("focus", dry_run=True)
+        self.assertEqual(self.backend.kill_calls, [])
+        self.assertEqual(sorted(pid for target in preview["targets"] for pid in target["pids"]), [10, 11])
+        self.assertAlmostEqual(preview["estimated_seconds"], 0.01)
+
+        self.manager.process_table.invalidate()
+        calls = self.backend.calls
+        _, report = self.manager.run_profile("focus")
+        self.assertEqual(self.backend.calls - calls, 1)
+        self.assertEqual(self.backend.kill_calls, [[10, 11]])
+        self.assertFalse(report.failed)
+
+    def test_option_index(self):
+        category, name, program = self.manager.program_options[1]
+        self.assertIs(self.manager.programs[category][name], program)
+        self.assertEqual(self.manager.category_options[1], next(iter(self.manager.programs)))
+        with patch('rich.prompt.Prompt.ask', side_effect=["1", "0"]), patch.object(ProgramManager, 'end_selected') as end_selected, \
+                patch.object(ProgramManager, 'list_programs'):
+            self.manager.end_programs()
+        end_selected.assert_called_once_with([program])
+
+    def test_profile_commands(self):
+        outputs = []
+        for argv in (["profile", "save", "quiet", "--category", "Communication"], ["profile", "list"], ["end", "--program", "Steam", "--dry-run"]):
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                self.assertEqual(run_command(self.manager, build_parser().parse_args(argv)), 0)
+            outputs.append(json.loads(output.getvalue()))
+        self.assertIn("Discord.exe", outputs[0]["images"])
+        self.assertEqual(outputs[1]["profiles"]["quiet"], {"categories": ["Communication"], "programs": []})
+        self.assertEqual(outputs[2]["targets"][0]["pids"], [10])
+        self.assertEqual(self.backend.kill_calls, [])
+
+class TestProgramCatalog(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.template = {"Gaming Platforms": {"Steam": {"processes": ["steam.exe", "steamwebhelper.exe"]}, "Epic": {"processes": ["epic.exe"]}},
+                         "Communication": {"Discord": {"processes": ["Discord.exe"]}}}
+        self.catalog = ProgramCatalog(os.path.join(self.root, "catalog.db"))
+        self.addCleanup(self.catalog.close)
+        self.catalog.import_template(self.template)
+
+    def test_import_export_round_trip(self):
+        self.assertEqual(self.catalog.export_json(), self.template)
+        self.assertEqual(list(self.catalog.export_json()["Gaming Platforms"]), ["Steam", "Epic"])
+        self.catalog.import_template({"Communication": {"Discord": {"processes": ["Discord.exe", "Update.exe"]}}})
+        self.assertEqual(self.catalog.export_json(), {"Communication": {"Discord": {"processes": ["Discord.exe", "Update.exe"]}}})
+
+    def test_lookup_image_is_case_insensitive(self):
+        self.assertEqual(self.catalog.lookup_image("DISCORD.EXE"), [("Communication", "Discord")])
+        self.assertEqual(self.catalog.lookup_image("missing.exe"), [])
+        self.assertEqual(self.catalog.category_programs("Gaming Platforms"), ["Steam", "Epic"])
+
+    def test_scans_are_per_user(self):
+        first = self.catalog.begin_scan("alice")
+        self.catalog.record_match(first, "alice", "Gaming Platforms", "Epic", "C:\\epic.exe")
+        self.catalog.finish_scan(first, "alice", 1, cancelled=False)
+        cancelled = self.catalog.begin_scan("alice")
+        self.catalog.record_match(cancelled, "alice", "Gaming Platforms", "Steam", "C:\\steam.exe")
+        self.catalog.finish_scan(cancelled, "alice", 1, cancelled=True)
+        self.assertEqual(self.catalog.export_json("alice"), {
+            "Gaming Platforms": {"Steam": {"processes": ["steam.exe", "steamwebhelper.exe"], "path": "C:\\steam.exe"},
+                                 "Epic": {"processes": ["epic.exe"], "path": "C:\\epic.exe"}},
+            "Communication": {}})
+        complete = self.catalog.begin_scan("alice")
+        self.catalog.record_match(complete, "alice", "Communication", "Discord", "D:\\discord.exe", {"product_name": "Discord"})
+        self.catalog.finish_scan(complete, "alice", 1, cancelled=False)
+        self.assertEqual(self.catalog.discovered(), [("alice", "Communication", "Discord", "D:\\discord.exe")])
+        self.assertEqual(self.catalog.export_json("alice")["Communication"]["Discord"]["version_info"], {"product_name": "Discord"})
+        self.assertFalse(self.catalog.has_scans("bob"))
+        self.assertEqual(self.catalog.export_json("bob"), {"Gaming Platforms": {}, "Communication": {}})
+
+    @patch('rich.console.Console.print')
+    def test_manager_uses_catalog(self, mock_print):
+        os.makedirs(os.path.join(self.root, "tree", "Steam"))
+        open(os.path.join(self.root, "tree", "Steam", "steam.exe"), "w").close()
+        with open(os.path.join(self.root, "programs.json"), "w") as f:
+            json.dump(self.template, f)
+        with open(os.path.join(self.root, "paths.json"), "w") as f:
+            json.dump({"paths": [os.path.join(self.root, "tree")]}, f)
+        manager = ProgramManager(config_file=os.path.join(self.root, "programs.json"), catalog_file=os.path.join(self.root, "catalog.db"))
+        self.addCleanup(manager.catalog.close)
+        self.assertEqual(set(manager.programs["Gaming Platforms"]), {"Steam", "Epic"})
+        manager.paths_file = os.path.join(self.root, "paths.json")
+        manager.user_config_file = os.path.join(self.root, "programs_db.json")
+        summary = manager.scan_programs()
+        self.assertEqual(summary["saved_to"], os.path.join(self.root, "catalog.db"))
+        self.assertFalse(os.path.exists(manager.user_config_file))
+        manager.load_config()
+        self.assertEqual(list(manager.programs["Gaming Platforms"]), ["Steam"])
+        self.assertEqual(manager.programs["Gaming Platforms"]["Steam"].path, os.path.join(self.root, "tree", "Steam", "steam.exe"))
+
+    def test_catalog_command(self):
+        with open(os.path.join(self.root, "programs.json"), "w") as f:
+            json.dump(self.template, f)
+        manager = ProgramManager(config_file=os.path.join(self.root, "programs.json"), catalog_file=os.path.join(self.root, "catalog.db"))
+        self.addCleanup(manager.catalog.close)
+        manager.user_config_file = os.path.join(self.root, "programs_db.json")
+        with open(manager.user_config_file, "w") as f:
+            json.dump({"Communication": {"Discord": {"processes": ["Discord.exe"], "path": "C:\\discord.exe"}}}, f)
+        outputs = []
+        for argv in (["catalog", "import"], ["catalog", "lookup", "discord.EXE"], ["catalog", "discovered"]):
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                self.assertEqual(run_command(manager, build_parser().parse_args(argv)), 0)
+            outputs.append(json.loads(output.getvalue()))
+        self.assertEqual((outputs[0]["programs"], outputs[0]["paths"]), (3, 1))
+        self.assertEqual(outputs[1]["programs"], [{"category": "Communication", "program": "Discord"}])
+        self.assertEqual(outputs[2]["paths"][0]["path"], "C:\\discord.exe")
+
+class TestBatchCommands(unittest.TestCase):
+    def run_command(self, backend, *argv):
+        manager = ProgramManager(process_backend=backend)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            exit_code = run_command(manager, build_parser().parse_args(list(argv)))
+        return exit_code, json.loads(output.getvalue())
+
+    def test_status(self):
+        backend = FakeProcessBackend([ProcessInfo("steam.exe", 10)])
+        exit_code, payload = self.run_command(backend, "status", "--category", "gaming platforms", "--running")
+        self.assertEqual(exit_code, 0)
+        self.assertEqual([entry["program"] for entry in payload["programs"]], ["Steam"])
+        self.assertEqual(backend.calls, 1)
+
+    def test_end(self):
+        backend = FakeProcessBackend([ProcessInfo("steam.exe", 10), ProcessInfo("discord.exe", 11)], protected=[11])
+        exit_code, payload = self.run_command(backend, "end", "--program", "Steam", "--program", "Discord")
+        self.assertEqual(exit_code, 1)
+        statuses = {result["process"]: result["status"] for result in payload["results"]}
+        self.assertEqual(statuses["steam.exe"], "ended")
+        self.assertEqual(statuses["Discord.exe"], "access denied")
+        self.assertEqual(backend.kill_calls, [[10, 11]])
+
+    def test_unknown_program(self):
+        exit_code, payload = self.run_command(FakeProcessBackend(), "end", "--program", "Nope")
+        self.assertEqual(exit_code, 2)
+        self.assertIn("Nope", payload["error"])
+
+    def test_online_presence(self):
+        backend = FakeProcessBackend([ProcessInfo("steam.exe", 10), ProcessInfo("chrome.exe", 12)])
+        exit_code, payload = self.run_command(backend, "online-presence")
+        self.assertEqual(exit_code, 0)
+        self.assertEqual([result["process"] for result in payload["results"] if result["status"] == "ended"], ["steam.exe"])
+
+    def test_online_presence_category_is_case_insensitive(self):
+        backend = FakeProcessBackend([ProcessInfo("Discord.exe", 10), ProcessInfo("steam.exe", 11)])
+        exit_code, payload = self.run_command(backend, "online-presence", "--category", "communication")
+        self.assertEqual(exit_code, 0)
+        self.assertEqual([(result["program"], result["status"]) for result in payload["results"] if result["status"] == "ended"], [("Discord", "ended")])
+
+    @patch('rich.console.Console.print')
+    def test_online_presence_menu_option(self, mock_print):
+        backend = FakeProcessBackend([ProcessInfo("steam.exe", 10)])
+        manager = ProgramManager(process_backend=backend)
+        with patch('rich.prompt.Prompt.ask', side_effect=["9", "0"]):
+            manager.run(banner=False)
+        self.assertEqual(backend.kill_calls, [[10]])
+
+class TestFleet(unittest.TestCase):
+    def setUp(self):
+        self.backends = [FakeProcessBackend([ProcessInfo("steam.exe", 10), ProcessInfo("EpicGamesLauncher.exe", 11)]),
+                         FakeProcessBackend([ProcessInfo("Discord.exe", 20)]),
+                         FakeProcessBackend([ProcessInfo("steam.exe", 30), ProcessInfo("chrome.exe", 31)])]
+
+    def fan_out(self, *argv, token=None, agent_token=None, extra_hosts=(), timeout=5.0):
+        import asyncio
+
+        async def scenario():
+            agents = [FleetAgent(ProgramManager(process_backend=backend), port=0, token=agent_token) for backend in self.backends]
+            servers = [await agent.start() for agent in agents]
+            hosts = [FleetHost("127.0.0.1", agent.port) for agent in agents] + list(extra_hosts)
+            controller = FleetController(hosts, token=token, timeout=timeout)
+            try:
+                return await controller.run(list(argv)), hosts, controller
+            finally:
+                await controller.close()
+                for server in servers:
+                    server.close()
+                    await server.wait_closed()
+
+        return asyncio.run(scenario())
+
+    def test_running_hosts(self):
+        from program_manager import summarize_fleet
+        responses, hosts, _ = self.fan_out("status", "--program", "Steam", "--running")
+        self.assertEqual(summarize_fleet(["status"], responses)["running"], {"Steam": [str(hosts[0]), str(hosts[2])]})
+
+    def test_end_category_everywhere(self):
+        from program_manager import summarize_fleet
+        responses, hosts, _ = self.fan_out("end", "--category", "Gaming Platforms")
+        self.assertEqual(summarize_fleet(["end"], responses)["ended"], {str(hosts[0]): 2, str(hosts[1]): 0, str(hosts[2]): 1})
+        self.assertEqual([backend.kill_calls for backend in self.backends], [[[10, 11]], [], [[30]]])
+
+    def test_free_memory_everywhere(self):
+        from program_manager import summarize_fleet
+        self.backends = [FakeProcessBackend([ProcessInfo("steam.exe", 10, memory=500 << 20), ProcessInfo("Discord.exe", 11, memory=100 << 20)]),
+                         FakeProcessBackend([ProcessInfo("chrome.exe", 20, memory=300 << 20)])]
+        responses, hosts, _ = self.fan_out("free-memory", "--top", "1")
+        summary = summarize_fleet(["free-memory"], responses)
+        self.assertEqual(summary["reclaimed"], {str(hosts[0]): 500 << 20, str(hosts[1]): 300 << 20})
+        self.assertEqual(summary["reclaimed_total"], 800 << 20)
+        self.assertEqual(summary["programs"], {str(hosts[0]): ["Steam"], str(hosts[1]): ["Google Chrome"]})
+
+    def test_connections_are_reused(self):
+        import asyncio
+
+        async def scenario():
+            agent = FleetAgent(ProgramManager(process_backend=self.backends[0]), port=0)
+            server = await agent.start()
+            controller = FleetController([FleetHost("127.0.0.1", agent.port)])
+            try:
+                first = await controller.run(["snapshot"])
+                running = await controller.running_hosts("Steam")
+                return first, running, controller.pool.opened
+            finally:
+                await controller.close()
+                server.close()
+                await server.wait_closed()
+
+        first, running, opened = asyncio.run(scenario())
+        self.assertEqual([process["pid"] for process in list(first.values())[0]["result"]["processes"]], [10, 11])
+        self.assertEqual(len(running), 1)
+        self.assertEqual(opened, 1)
+
+    def test_unreachable_and_silent_hosts(self):
+        import asyncio
+        import socket
+        closed = socket.socket()
+        closed.bind(("127.0.0.1", 0))
+        unreachable = FleetHost("127.0.0.1", closed.getsockname()[1])
+        closed.close()
+
+        async def scenario():
+            # Accepts connections but never answers
+            silent = await asyncio.start_server(lambda reader, writer: None, "127.0.0.1", 0)
+            host = FleetHost("127.0.0.1", silent.sockets[0].getsockname()[1])
+            controller = FleetController([host, unreachable], timeout=0.2)
+            try:
+                return await controller.run(["status"]), host
+            finally:
+                await controller.close()
+                silent.close()
+
+        responses, silent = asyncio.run(scenario())
+        self.assertIn("timed out", responses[str(silent)]["error"])
+        self.assertIn("error", responses[str(unreachable)])
+
+    def test_token_and_command_checks(self):
+        responses, _, _ = self.fan_out("status", token="wrong", agent_token="secret")
+        self.assertEqual({response["error"] for response in responses.values()}, {"invalid token"})
+        responses, _, _ = self.fan_out("watch", token="secret", agent_token="secret")
+        self.assertTrue(all("unsupported command" in response["error"] for response in responses.values()))
+
+    @patch('rich.console.Console.print')
+    def test_scan_with_catalog(self, mock_print):
+        import asyncio
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        os.makedirs(os.path.join(root, "tree", "Steam"))
+        open(os.path.join(root, "tree", "Steam", "steam.exe"), "w").close()
+        with open(os.path.join(root, "programs.json"), "w") as f:
+            json.dump({"Gaming Platforms": {"Steam": {"processes": ["steam.exe"]}}}, f)
+        with open(os.path.join(root, "paths.json"), "w") as f:
+            json.dump({"paths": [os.path.join(root, "tree")]}, f)
+        manager = ProgramManager(config_file=os.path.join(root, "programs.json"), process_backend=self.backends[0],
+                                 catalog_file=os.path.join(root, "catalog.db"))
+        self.addCleanup(manager.catalog.close)
+        manager.paths_file = os.path.join(root, "paths.json")
+        manager.user_config_file = os.path.join(root, "programs_db.json")
+
+        async def scenario():
+            agent = FleetAgent(manager, port=0)
+            server = await agent.start()
+            controller = FleetController([FleetHost("127.0.0.1", agent.port)])
+            try:
+                scanned = await controller.run(["scan"])
+                with patch('program_manager.execute_command', side_effect=RuntimeError("boom")):
+                    failed = await controller.run(["status"])
+                return list(scanned.values())[0], list(failed.values())[0]
+            finally:
+                await controller.close()
+                server.close()
+                await server.wait_closed()
+
+        scanned, failed = asyncio.run(scenario())
+        self.assertEqual(scanned["exit_code"], 0)
+        self.assertEqual(scanned["result"]["programs_found"], 1)
+        self.assertEqual(manager.catalog.discovered()[0][3], os.path.join(root, "tree", "Steam", "steam.exe"))
+        self.assertEqual(failed["error"], "RuntimeError: boom")
+
+    def test_host_parsing(self):
+        self.assertEqual(FleetHost.parse("pc1:9000"), FleetHost("pc1", 9000))
+        self.assertEqual(FleetHost.parse("pc1", 9001), FleetHost("pc1", 9001))
+        self.assertEqual(FleetHost.parse("[::1]:9000"), FleetHost("::1", 9000))
+
+class TestProcessWatcher(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.backend = FakeProcessBackend([ProcessInfo("steam.exe", 10), ProcessInfo("Discord.exe", 20), ProcessInfo("chrome.exe", 30)])
+        self.manager = ProgramManager(process_backend=self.backend)
+        policies = {"Gaming Platforms": WatchPolicy("kill"), "Communication": WatchPolicy.parse("kill-after:30"),
+                    "Web Browsers": WatchPolicy.parse("log")}
+        self.watcher = ProcessWatcher(self.manager, policies, respawn_limit=2, respawn_window=60, backoff=300, clock=lambda: self.now)
+
+    def kinds(self, events):
+        return [(event.kind, event.pid) for event in events]
+
+    def test_policies(self):
+        self.assertEqual(self.kinds(self.watcher.poll()), [("started", 20), ("started", 30), ("killed", 10)])
+        self.now = 10
+        self.assertEqual(self.kinds(self.watcher.poll()), [("exited", 10)])
+        self.now = 31
+        self.assertEqual(self.kinds(self.watcher.poll()), [("killed", 20)])
+        self.assertEqual(self.backend.kill_calls, [[10], [20]])
+
+    def test_policy_category_is_case_insensitive(self):
+        watcher = ProcessWatcher(self.manager, {"gaming platforms": WatchPolicy("kill")}, clock=lambda: self.now)
+        events = watcher.poll()
+        self.assertEqual([(event.kind, event.pid, event.category) for event in events if event.kind == "killed"], [("killed", 10, "Gaming Platforms")])
+
+    def test_respawn_debounce(self):
+        self.watcher.poll()
+        for pid in (11, 12, 13):
+            self.now += 1
+            self.backend.processes.append(ProcessInfo("steam.exe", pid))
+            events = self.watcher.poll()
+        self.assertIn(("suppressed", 13), self.kinds(events))
+        self.assertEqual(self.backend.kill_calls, [[10], [11]])
+
+    def test_respawn_limit_counts_kill_passes(self):
+        backend = FakeProcessBackend([ProcessInfo("chrome.exe", pid) for pid in range(100, 106)])
+        watcher = ProcessWatcher(ProgramManager(process_backend=backend), {"Web Browsers": WatchPolicy("kill")},
+                                 respawn_limit=2, respawn_window=60, backoff=300, clock=lambda: self.now)
+        watcher.poll()
+        self.assertEqual(backend.kill_calls, [list(range(100, 106))])
+        self.now = 1
+        backend.processes.append(ProcessInfo("chrome.exe", 200))
+        watcher.poll()
+        self.now = 2
+        backend.processes.extend([ProcessInfo("chrome.exe", 201), ProcessInfo("chrome.exe", 202)])
+        self.assertEqual(self.kinds(watcher.poll()), [("exited", 200), ("suppressed", 201), ("suppressed", 202)])
+        # Once the backoff is over the processes left alone are ended after all
+        self.now = 303
+        self.assertEqual(self.kinds(watcher.poll()), [("killed", 201), ("killed", 202)])
+        self.assertEqual(backend.kill_calls[1:], [[200], [201, 202]])
+
+    def test_idle_poll_only_diffs(self):
+        self.watcher.poll()
+        self.now = 31
+        self.watcher.poll()
+        self.assertEqual(self.kinds(self.watcher.poll()), [("exited", 20)])
+        calls = self.backend.calls
+        self.assertEqual(self.watcher.poll(), [])
+        self.assertEqual(self.backend.calls, calls + 1)
+
+    def test_parse_policy(self):
+        self.assertEqual(WatchPolicy.parse("kill-after:5"), WatchPolicy("kill-after", 5.0))
+        with self.assertRaises(ValueError):
+            WatchPolicy.parse("explode")
+
+class TestMetrics(unittest.TestCase):
+    def test_disabled_records_nothing(self):
+        metrics = Metrics()
+        with metrics.timer("status.probe"):
+            metrics.count("subprocess.spawns")
+        self.assertEqual(metrics.summary(), {"counters": {}, "latencies": {}, "actions": {}})
+
+    def test_histogram(self):
+        metrics = Metrics()
+        metrics.enabled = True
+        for seconds in [0.0005] * 9 + [0.3]:
+            metrics.observe("kill.batch", seconds)
+        latency = metrics.summary()["latencies"]["kill.batch"]
+        self.assertEqual(latency["count"], 10)
+        self.assertEqual(latency["p50"], 0.001)
+        self.assertEqual(latency["p95"], 0.3)
+        self.assertEqual(latency["buckets"]["0.5"], 1)
 
     @patch('subprocess.run')
-    def test_end(self, mock_run):
+    def test_counts_spawns(self, mock_run):
+        metrics = Metrics()
+        metrics.enabled = True
+        mock_run.return_value.stdout = ""
+        with patch('program_manager.metrics', metrics):
+            TasklistBackend().list_processes()
+            TasklistBackend().kill_pids([1, 2], timeout=5)
+        self.assertEqual(metrics.counters["subprocess.spawns"], 2)
+        self.assertEqual(set(metrics.latencies), {"subprocess.tasklist", "subprocess.taskkill"})
+
+class TestBenchmarks(unittest.TestCase):
+    def test_smoke(self):
+        import benchmarks
+        output = os.path.join(tempfile.mkdtemp(), "bench.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+        with patch('sys.stderr', new_callable=io.StringIO):
+            self.assertEqual(benchmarks.main(["--scales", "small", "--repeat", "1", "--no-scan", "--output", output]), 0)
+        with open(output) as f:
+            names = {result["name"] for result in json.load(f)["results"]}
+        self.assertIn("end_categories", names)
+
+    def test_generate_tree(self):
+        import benchmarks
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        template = benchmarks.synthetic_template(20)
+        benchmarks.generate_tree(root, template, files=400, depth=3, density=0.5)
+        found = list(walk_executables(root))
+        self.assertGreater(len(found), 100)
+        self.assertTrue(any(path.count(os.sep) - root.count(os.sep) == 4 for path in found))
+
+class TestProgram(unittest.TestCase):
+    def test_is_running(self):
+        snapshot = ProcessSnapshot([ProcessInfo("notepad.exe", 1234)])
         program = Program(name="TestProgram", processes=["notepad.exe"])
-        program.end()
-        mock_run.assert_called_with(["taskkill", "/IM", "notepad.exe", "/F"], check=True, capture_output=True, encoding='utf-8', errors='replace')
+        self.assertTrue(program.is_running(snapshot))
+
+    def test_end(self):
+        backend = FakeProcessBackend([ProcessInfo("notepad.exe", 1234)])
+        program = Program(name="TestProgram", processes=["notepad.exe", "notepad_helper.exe"])
+        report = program.end(backend=backend)
+        self.assertEqual(backend.kill_calls, [[1234]])
+        self.assertEqual([result.status for result in report.results], [EndStatus.ENDED, EndStatus.NOT_RUNNING])
+
+class TestProcessMatcher(unittest.TestCase):
+    def setUp(self):
+        self.matcher = ProcessMatcher([
+            ("Steam", ["steam.exe", {"image": "steamwebhelper.exe", "path": "C:\\Program Files*\\Steam\\*"}]),
+            ("Updaters", ["*updater*.exe"]),
+            ("Chrome", [{"image": "re:chrome(_proxy)?\\.exe", "cmdline": "--type=renderer"}]),
+        ])
+
+    def test_exact_glob_and_regex_names(self):
+        self.assertEqual([self.matcher.rules[i].owner for i in self.matcher.rules_for_name("STEAM.EXE")], ["Steam"])
+        self.assertEqual([self.matcher.rules[i].owner for i in self.matcher.rules_for_name("GoogleUpdater_x64.exe")], ["Updaters"])
+        self.assertTrue(self.matcher.is_candidate("chrome_proxy.exe"))
+        # Names are matched whole, a rule is never a substring hit
+        self.assertFalse(self.matcher.is_candidate("steam.exe.bak"))
+        self.assertFalse(self.matcher.is_candidate("mysteam.exe"))
+
+    def test_constraints(self):
+        snapshot = ProcessSnapshot([
+            ProcessInfo("steamwebhelper.exe", 1, "C:\\Program Files (x86)\\Steam\\bin\\steamwebhelper.exe"),
+            ProcessInfo("steamwebhelper.exe", 2, "D:\\Games\\steamwebhelper.exe"),
+            ProcessInfo("chrome.exe", 3, None, "chrome.exe --type=renderer --lang=en"),
+            ProcessInfo("chrome.exe", 4, None, "chrome.exe"),
+            ProcessInfo("chrome.exe", 5),
+        ])
+        owners = {owner: [process.pid for process in processes] for owner, processes in self.matcher.owners(snapshot).items()}
+        self.assertEqual(owners, {"Steam": [1], "Chrome": [3]})
+        self.assertTrue(self.matcher.needs_details)
+        self.assertEqual(self.matcher.match_file("D:\\Games\\steamwebhelper.exe"), [])
+        self.assertEqual(self.matcher.match_file("C:\\Program Files\\Steam\\steamwebhelper.exe"), ["Steam"])
+
+    def test_patterns_that_cannot_be_combined(self):
+        # Inline flags, named groups and backreferences are matched on their own instead of inside the alternation
+        matcher = ProcessMatcher([("Chrome", ["re:(?i)^chrome.*"]), ("A", ["re:(?P<n>a)b\\.exe"]), ("B", ["re:(?P<n>c)d\\.exe"]),
+                                  ("X", ["re:(x)y\\.exe"]), ("Double", ["re:(a)\\1\\.exe"]), ("Escaped", ["re:z\\\\1\\.exe"])])
+        owners = lambda name: [matcher.rules[i].owner for i in matcher.rules_for_name(name)]
+        self.assertEqual(owners("CHROME_proxy.exe"), ["Chrome"])
+        self.assertEqual(owners("ab.exe"), ["A"])
+        self.assertEqual(owners("cd.exe"), ["B"])
+        self.assertEqual(owners("aa.exe"), ["Double"])
+        self.assertEqual(owners("xy.exe"), ["X"])
+        self.assertEqual(owners("z\\1.exe"), ["Escaped"])
+        self.assertEqual([matcher.rules[i].owner for i, _ in matcher.patterns], ["X", "Escaped"])
+
+    def test_program_with_patterns(self):
+        backend = FakeProcessBackend([ProcessInfo("GoogleUpdater.exe", 10), ProcessInfo("explorer.exe", 11)])
+        program = Program("Updaters", ["*updater*.exe"])
+        self.assertTrue(program.is_running(ProcessSnapshot(backend.list_processes())))
+        report = program.end(backend=backend)
+        self.assertEqual([(result.process, result.status, result.pids) for result in report.results], [("*updater*.exe", EndStatus.ENDED, [10])])
+        self.assertTrue(StatusProber(backend).probe([Program("Explorer", ["re:explorer\\.exe"]), program]) == [True, False])
+
+    def test_invalid_pattern_names_the_program(self):
+        with self.assertRaisesRegex(re.error, r"Chrome: invalid pattern 're:chrome\(\.exe'"):
+            ProcessMatcher([("Steam", ["steam.exe"]), (Program("Chrome", ["re:chrome(.exe"]), ["re:chrome(.exe"])])
+        with self.assertRaisesRegex(re.error, "Browsers/Chrome"):
+            ProcessMatcher([(("Browsers", "Chrome"), [{"image": "chrome.exe", "cmdline": "--type=[renderer"}])])
+
+class TestProcessTerminator(unittest.TestCase):
+    def test_batches_and_skips_stopped_images(self):
+        backend = FakeProcessBackend([ProcessInfo("a.exe", pid) for pid in range(1, 6)] + [ProcessInfo("b.exe", 10)], protected=[10])
+        programs = [Program("A", ["a.exe", "missing.exe"]), Program("B", ["b.exe", "a.exe"])]
+        report = ProcessTerminator(backend, batch_size=2).end(programs, ProcessSnapshot(backend.list_processes()))
+        self.assertEqual(sorted(pid for batch in backend.kill_calls for pid in batch), [1, 2, 3, 4, 5, 10])
+        self.assertEqual(len(backend.kill_calls), 3)
+        statuses = {(result.program, result.process): result.status for result in report.results}
+        self.assertEqual(statuses[("A", "a.exe")], EndStatus.ENDED)
+        self.assertEqual(statuses[("A", "missing.exe")], EndStatus.NOT_RUNNING)
+        self.assertEqual(statuses[("B", "b.exe")], EndStatus.ACCESS_DENIED)
+
+    @patch('subprocess.run')
+    def test_taskkill_output(self, mock_run):
+        mock_run.return_value.returncode = 128
+        mock_run.return_value.stdout = 'SUCCESS: The process with PID 1 has been terminated.\n'
+        mock_run.return_value.stderr = 'ERROR: The process with PID 2 could not be terminated.\nReason: Access is denied.\nERROR: The process "3" not found.\n'
+        statuses = TasklistBackend().kill_pids([1, 2, 3], timeout=5)
+        self.assertEqual(mock_run.call_args[0][0], ["taskkill", "/F", "/PID", "1", "/PID", "2", "/PID", "3"])
+        self.assertEqual(statuses, {1: EndStatus.ENDED, 2: EndStatus.ACCESS_DENIED, 3: EndStatus.NOT_RUNNING})
+
+    def test_graceful_tree_termination(self):
+        processes = [ProcessInfo("steam.exe", 10, ppid=1), ProcessInfo("steamwebhelper.exe", 11, ppid=10),
+                     ProcessInfo("steamwebhelper.exe", 12, ppid=11), ProcessInfo("explorer.exe", 20, ppid=1)]
+        backend = FakeProcessBackend(processes, stubborn=[12], close_delay=0.05)
+        terminator = ProcessTerminator(backend, graceful=True, close_timeout=0.3, poll_interval=0.01)
+        report = terminator.end([Program("Steam", ["steam.exe"])], ProcessSnapshot(backend.list_processes()))
+        self.assertEqual(report.results, [EndResult("Steam", "steam.exe", EndStatus.ENDED, [10, 11, 12], [12])])
+        self.assertEqual(backend.close_calls, [[10, 11, 12]])
+        self.assertEqual(backend.kill_calls, [[12]])
+        self.assertEqual([process.pid for process in backend.list_processes()], [20])
+
+    def test_tree_skips_reused_parent_pids(self):
+        # 30 outlived the original PID 10, which now belongs to a steam.exe started later
+        processes = [ProcessInfo("steam.exe", 10, ppid=1, started=500.0), ProcessInfo("steamwebhelper.exe", 11, ppid=10, started=501.0),
+                     ProcessInfo("editor.exe", 30, ppid=10, started=100.0), ProcessInfo("tool.exe", 31, ppid=10)]
+        snapshot = ProcessSnapshot(processes)
+        self.assertEqual([process.pid for process in snapshot.descendants([processes[0]])], [10, 11, 31])
+
+    @patch('subprocess.run')
+    def test_tasklist_details_read_creation_time(self, mock_run):
+        mock_run.return_value.stdout = ('"Name","ProcessId","ExecutablePath","CommandLine","ParentProcessId","WorkingSetSize","UserModeTime",'
+                                        '"KernelModeTime","CreationDate"\n"steam.exe","10","C:\\steam.exe","steam.exe","1","4096","10000000","0",'
+                                        '"133000000000000000"\n')
+        processes = TasklistBackend().list_processes(details=True)
+        self.assertIn("ToFileTimeUtc", mock_run.call_args[0][0][-1])
+        self.assertEqual(processes, [ProcessInfo("steam.exe", 10, "C:\\steam.exe", "steam.exe", 1, 4096, 1.0, 13300000000.0)])
+
+    def test_graceful_deadlines_run_concurrently(self):
+        backend = FakeProcessBackend([ProcessInfo(f"app{i}.exe", i) for i in range(1, 5)], stubborn=[1, 2, 3])
+        programs = [Program(f"App {i}", [f"app{i}.exe"], close_timeout=0.3) for i in range(1, 4)]
+        programs.append(Program("Quick", ["app4.exe"], close_timeout=5))
+        terminator = ProcessTerminator(backend, graceful=True, poll_interval=0.01)
+        report = terminator.end(programs, ProcessSnapshot(backend.list_processes()))
+        self.assertLess(report.elapsed, 0.6)
+        self.assertEqual([result.forced for result in report.results], [[1], [2], [3], []])
+        self.assertEqual(backend.kill_calls, [[1, 2, 3]])
+        self.assertEqual(backend.list_processes(), [])
+
+    def test_procfs_reads_parent_pids(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        busy = "7 (busy) S 1 7 7 0 -1 4194560 100 0 0 0 250 50 0 0 20 0 1 0 100 1000000 256"
+        for pid, stat in [("1", "1 (init) S 0 1 1"), ("42", "42 (my (odd) app) R 1 42 42"), ("7", busy), ("self", "")]:
+            os.makedirs(os.path.join(root, pid))
+            with open(os.path.join(root, pid, "stat"), "w") as f:
+                f.write(stat)
+        processes = sorted(ProcfsBackend(root).list_processes(), key=lambda process: process.pid)
+        self.assertEqual([processes[0], processes[2]], [ProcessInfo("init", 1, ppid=0), ProcessInfo("my (odd) app", 42, ppid=1)])
+        self.assertEqual(processes[1], ProcessInfo("busy", 7, ppid=1, memory=256 * ProcfsBackend.PAGE_SIZE, cpu_time=300 / ProcfsBackend.CLOCK_TICKS,
+                                                   started=100 / ProcfsBackend.CLOCK_TICKS))
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file